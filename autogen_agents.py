@@ -1,4 +1,6 @@
 import os
+import gc
+import functools
 import subprocess
 import shlex
 from typing_extensions import Annotated
@@ -7,6 +9,18 @@ from autogen import ConversableAgent, GroupChat, GroupChatManager, UserProxyAgen
 from autogen.coding import DockerCommandLineCodeExecutor
 from autogen_core.memory import ListMemory
 from autogen import gather_usage_summary
+from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+
+from chat_history import HistoryCompactor
+from chat_monitor import ChatMonitor
+from speaker_schedule import SpeakerStateMachine
+from tools.code_index import CodeSearchTool
+from tools.file_tool import FileTool
+from tools.git_tool import GitTool
+from tools.list_dir_tool import ListDirectoryTool
+from tools.patch_tool import PatchTool
+from tracing import span, traced
+from transcript_store import TranscriptWriter
 
 
 # def read_file(path: Annotated[str, "Relative file path"]) -> str:
@@ -51,22 +65,107 @@ from autogen import gather_usage_summary
 #     except Exception as e:
 #         return f"ERROR: {e}"
 
+def is_termination_msg(msg):
+    # Tool-Calls haben keinen Text-Content
+    return "TERMINATE" in str(msg.get("content") or "").upper()
+
+
+def _as_function(method):
+    # register_function akzeptiert nur Funktionen, keine gebundenen Methoden der Tool-Klassen
+    @functools.wraps(method)
+    def tool(*args, **kwargs):
+        return method(*args, **kwargs)
+
+    return tool
+
+
+def _token_usage(agent):
+    # Summe über alle Modelle aus dem OpenAIWrapper des Agents (inkl. gecachter Antworten)
+    summary = getattr(getattr(agent, "client", None), "total_usage_summary", None) or {}
+    prompt = sum(v.get("prompt_tokens", 0) for k, v in summary.items() if k != "total_cost")
+    completion = sum(v.get("completion_tokens", 0) for k, v in summary.items() if k != "total_cost")
+    return prompt, completion
+
+
+def _traced_with_tokens(func, agent, name, cat):
+    """Wrap ``func`` in a span that also records the tokens ``agent`` used during the call."""
+    def wrapper(*args, **kwargs):
+        before = _token_usage(agent)
+        with span(name, cat, agent=agent.name) as attrs:
+            result = func(*args, **kwargs)
+            after = _token_usage(agent)
+            attrs["prompt_tokens"] = after[0] - before[0]
+            attrs["completion_tokens"] = after[1] - before[1]
+        return result
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
 class AutogenAgents:
-    def __init__(self, llm_config={}, current_dir: str = "", executor=None, max_rounds: int = 5):
-        self.llm_config = llm_config
+    def __init__(self, llm_config={}, current_dir: str = "", executor=None, max_rounds: int = 5, cache=None,
+                 context_budget: int = None, edit_tools: bool = True, search_tools: bool = True, file_tools: bool = True,
+                 stall_detection: bool = True, router=None, speaker_selection: str = "auto", transcript_file: str = None):
+        # Mit Router (model_router.ModelRouter) bekommt jede Rolle ihre eigene Modell-Reihenfolge inkl. Fallbacks,
+        # sonst nutzen alle Agents llm_config
+        def config_for(role):
+            config = router.llm_config(role) if router else llm_config
+            # Eigener Response-Cache (llm_cache.LLMCache) ersetzt den autogen-internen cache_seed-Cache
+            return {**config, "cache_seed": None} if cache is not None else config
+
+        self.config_for = config_for
+        self.llm_config = config_for("user")
+        self.cache = cache
         self.manager = None
         self.agents = []
         self.current_dir = current_dir
         self.last_chat = None
+        self.last_cache_stats = None
+        self.last_stop_reason = None
+        self.stall_detection = stall_detection
+        # "auto": Manager wählt jeden Sprecher per LLM; "rules": SpeakerStateMachine, LLM nur als Fallback
+        if speaker_selection not in ("auto", "rules"):
+            raise ValueError(f"Unknown speaker selection mode '{speaker_selection}', expected 'auto' or 'rules'")
+        self.speaker_selection = speaker_selection
+        self.last_speaker_stats = None
+        # Nachrichten werden während des Chats nach transcript_file gestreamt (gzip-JSONL), nicht im Speicher gehalten
+        self.transcript_file = transcript_file
+        self.last_transcript_stats = None
+        # Verlauf pro LLM-Call auf context_budget Tokens begrenzen (None = ganzer Verlauf)
+        self.history_compactor = None
+        if context_budget:
+            model = router.model("coder") if router else llm_config.get("model", "gpt-4o")
+            self.history_compactor = HistoryCompactor(max_tokens=context_budget, model=model)
 
-        # Code-Executor im Docker-Container
+        # Code-Executor im Docker-Container (von außen übergebene, z.B. gepoolte Executors werden nicht gestoppt)
+        self._owns_executor = not executor
         if not executor:
             executor = DockerCommandLineCodeExecutor(
                 image="maximiliantoepfer1/autogen-agent",
                 timeout=120,
                 work_dir=current_dir,
             )
-        # self.executor = executor
+        self.executor = executor
+
+        search_instructions = ""
+        if search_tools:
+            search_instructions = (
+                "Explore the repository with the tools `find_symbol` (where a class/function is defined), "
+                "`grep` (search text in all files) and `read_range` (read only the relevant lines of a file) "
+                "instead of reading whole files. \n"
+            )
+        # Datei-Tools laufen auf dem Host – kein Umweg über Code-Blöcke im Docker-Container nur zum Lesen
+        file_instructions = ""
+        git_instructions = "Do not assume that Git is used. You can assume that the project is locally available as files. \n"
+        if file_tools:
+            file_instructions = (
+                "Read files with `read_range` and look at the project structure with `list_directory` "
+                "instead of writing code to do it. \n"
+            )
+            git_instructions = (
+                "The project is locally available as files. Git can only be queried read-only with the `git` tool "
+                "(e.g. 'log -5 -- <path>', 'blame -L 10,30 <path>', 'show <commit>'). \n"
+            )
 
         self.planner_agent = ConversableAgent(
             name="Planner_Agent",
@@ -78,18 +177,37 @@ class AutogenAgents:
                 "- The full path to the file to be created or modified (e.g., 'src/prices/get_prices.py') \n"
                 "- A precise description of what should be added, changed, or removed in that file \n"
                 "You are not allowed to write any code yourself. Your task is only to generate a clear plan for the Coding Agent. \n"
-                "Do not assume that Git is used. You can assume that the project is locally available as files. \n"
+                f"{git_instructions}"
+                f"{search_instructions}"
+                f"{file_instructions}"
                 "After reasoning and exploration, you must stop and write the final plan in natural language."
                 "If you notice that no progress is being made, or that you cannot proceed, you must respond with the word 'TERMINATE'. "
                 "Do not continue the conversation endlessly.  Always ensure to stop the conversation if your task is completed or blocked."
             ),
-            llm_config=llm_config,
+            llm_config=config_for("planner"),
             # chat_messages=memory,
             human_input_mode="NEVER",
             max_consecutive_auto_reply=max_rounds,
-            is_termination_msg=lambda msg: "TERMINATE" in msg["content"].upper(),
+            is_termination_msg=is_termination_msg,
         )
 
+        if edit_tools:
+            edit_instructions = (
+                "- Read the part of the file that has to change\n"
+                "- Apply the required changes with the `replace_in_file` tool (a search block of the current lines including a few unchanged lines of context, and its replacement) "
+                "or with the `apply_patch` tool (a unified diff, for several hunks or files at once)\n"
+                "Only send the changed lines — never rewrite the complete content of an existing file. "
+                "To create a new file, call `replace_in_file` with an empty search block.\n"
+                "If an edit is rejected, read the current content of the file again and retry with the exact lines.\n"
+            )
+        else:
+            edit_instructions = (
+                "- Read the entire file\n"
+                "- Apply the required changes\n"
+                "- Overwrite the file with the complete updated content\n"
+                "Always ensure that you write the full content of the target file — never just append snippets or make partial replacements.\n"
+            )
+
         self.coding_agent = ConversableAgent(
             name="Coding_Agent",
             system_message=(
@@ -99,22 +217,20 @@ class AutogenAgents:
                 "___\n"
                 "For each step:\n"
                 "- Open the specified file\n"
-                "- Read the entire file\n"
-                "- Apply the required changes\n"
-                "- Overwrite the file with the complete updated content\n"
-                "Always ensure that you write the full content of the target file — never just append snippets or make partial replacements.\n"
+                f"{edit_instructions}"
+                f"{file_instructions}"
                 "Only use proper Python filenames such as 'main.py', 'get_prices.py', etc. that reflect the project structure.\n"
                 "You must not use Git or mention git commands. Just write files locally in the file system."
                 "If you notice that no progress is being made, or that you cannot proceed, you must respond with the word 'TERMINATE'. "
                 "Do not continue the conversation endlessly.  Always ensure to stop the conversation if your task is completed or blocked."
 
             ),
-            llm_config=llm_config,
+            llm_config=config_for("coder"),
             # chat_messages=memory,
             code_execution_config={"executor": executor},
             human_input_mode="NEVER",
             max_consecutive_auto_reply=max_rounds,
-            is_termination_msg=lambda msg: "TERMINATE" in msg["content"].upper(),
+            is_termination_msg=is_termination_msg,
         )
 
         # Test Agent blockiert ziemlich oft den Chat und sorgt für ewige loops - daher vorerst deaktiviert
@@ -164,23 +280,143 @@ class AutogenAgents:
             human_input_mode="NEVER",
             code_execution_config={"executor": executor},
             max_consecutive_auto_reply=max_rounds,
-            is_termination_msg=lambda msg: "TERMINATE" in msg["content"].upper(),
+            is_termination_msg=is_termination_msg,
         )
-        
-        
-        # !!! TOOLS funktionieren auch nach vielem probieren nicht zuverlässig ... !!!
-        # Als code scheint deprecated zu sein, aber die register_functions wirft manchmal Fehler. 
-        # Agenten brauchen es aber scheinbar nicht zum bearbeiten.
-        
-        # for agent in self.agents:
-        #     register_function(read_file, caller=agent, executor=self.user_proxy, name="read_file", description="Read a file.")
-        #     register_function(write_file, caller=agent, executor=self.user_proxy, name="write_file", description="Overwrite file.")
-        #     register_function(list_dir, caller=agent, executor=self.user_proxy, name="list_dir", description="List directory.")
-        #     register_function(run_git, caller=agent, executor=self.user_proxy, name="run_git", description="Run git command.")
 
+        if self.history_compactor:
+            for agent in [self.user_proxy] + self.agents:
+                TransformMessages(transforms=[self.history_compactor], verbose=False).add_to_agent(agent)
+
+        # Edit-Tools: der Coding_Agent schickt nur geänderte Blöcke, der User führt sie auf dem Host aus
+        if edit_tools:
+            self.patch_tool = PatchTool(current_dir)
+            register_function(
+                _as_function(self.patch_tool.replace_in_file), caller=self.coding_agent, executor=self.user_proxy,
+                name="replace_in_file",
+                description="Replace a block of lines in a file (fuzzy matched) or create a new file with an empty search block.",
+            )
+            register_function(
+                _as_function(self.patch_tool.apply_patch), caller=self.coding_agent, executor=self.user_proxy,
+                name="apply_patch",
+                description="Apply a unified diff to one or more files. Nothing is written if any hunk does not apply.",
+            )
+
+        # Such-Tools auf dem geteilten Repo-Index (tools/code_index.py), ausgeführt vom User auf dem Host
+        if search_tools:
+            self.search_tool = CodeSearchTool(current_dir)
+            for agent in self.agents:
+                register_function(
+                    _as_function(self.search_tool.find_symbol), caller=agent, executor=self.user_proxy, name="find_symbol",
+                    description="Find classes, functions and methods by name; returns file and line range.",
+                )
+                register_function(
+                    _as_function(self.search_tool.grep), caller=agent, executor=self.user_proxy, name="grep",
+                    description="Search a text or regular expression in the repository; returns file:line matches.",
+                )
+                if not file_tools:
+                    register_function(
+                        _as_function(self.search_tool.read_range), caller=agent, executor=self.user_proxy,
+                        name="read_range", description="Read a line range of a file (with line numbers).",
+                    )
+
+        # Lesende Datei-/Verzeichnis-/Git-Tools (tools/file_tool.py, list_dir_tool.py, git_tool.py) auf dem Host
+        if file_tools:
+            self.file_tool = FileTool(current_dir)
+            self.list_dir_tool = ListDirectoryTool(current_dir)
+            self.git_tool = GitTool(current_dir)
+            for agent in self.agents:
+                register_function(
+                    _as_function(self.file_tool.read_range), caller=agent, executor=self.user_proxy, name="read_range",
+                    description="Read a line range of a file (with line numbers); cached until the file changes.",
+                )
+                register_function(
+                    _as_function(self.list_dir_tool.list_directory), caller=agent, executor=self.user_proxy,
+                    name="list_directory",
+                    description="List a directory tree up to a depth, without ignored and build/cache files.",
+                )
+            # Nur der Planner braucht Historie/Blame; der Coding_Agent soll Git nicht verwenden
+            register_function(
+                _as_function(self.git_tool.git), caller=self.planner_agent, executor=self.user_proxy, name="git",
+                description="Run a read-only git command (log, show, blame, diff, status, grep, ls-files, ...).",
+            )
+
+        # Tracing: Dauer und Tokens pro Agent-Antwort sowie jede Code-Ausführung im Docker-Container
+        for agent in [self.user_proxy] + self.agents:
+            agent.generate_reply = _traced_with_tokens(agent.generate_reply, agent, f"reply:{agent.name}", "agent")
+        executor.execute_code_blocks = traced(executor.execute_code_blocks, "execute_code", "executor")
+
+
+    def assign_task(self, task: str, max_rounds: int = 5, stop_event=None):
+        select_speaker_transform = None
+        if self.history_compactor:
+            select_speaker_transform = TransformMessages(transforms=[self.history_compactor], verbose=False)
+        agents = [self.user_proxy] + self.agents
+        schedule = SpeakerStateMachine(executor_name=self.user_proxy.name) if self.speaker_selection == "rules" else None
+        groupchat = GroupChat(
+            agents=agents,
+            messages=[],
+            max_round=max_rounds,
+            select_speaker_transform_messages=select_speaker_transform,
+            select_speaker_auto_llm_config=self.config_for("speaker_selection"),
+            speaker_selection_method=schedule.select if schedule else "auto",
+            allowed_or_disallowed_speaker_transitions=schedule.transitions_for(agents) if schedule else None,
+            speaker_transitions_type="allowed" if schedule else None,
+        )
+        # Transkript: jede Nachricht des Group-Chats sofort auf die Platte; gleiche Inhalte teilen sich
+        # über alle Agents (und parallele Chats) ein String-Objekt.
+        # Vor dem Manager ersetzen – der arbeitet auf einer flachen Kopie des GroupChat.
+        transcript = TranscriptWriter(self.transcript_file)
+        append = groupchat.append
+
+        def append_to_transcript(message, speaker):
+            append(message, speaker)
+            transcript.append(message)
+
+        groupchat.append = append_to_transcript
+        # Sprecherauswahl per LLM ist pro Runde ein eigener Zwei-Agenten-Chat von autogen mit eigenem Client
+        # (nicht dem des Managers) – dessen Agent abgreifen, um Dauer, Tokens und Kosten zu zählen.
+        # autogen startet diesen Chat mit cache=None; über den Response-Cache leiten, damit ein Replay
+        # dieselben Sprecher wählt statt live anzufragen. Ebenfalls vor dem Manager ersetzen.
+        cache_session = self.cache.session() if self.cache else None
+        selection_agents = []
+        create_internal_agents = groupchat._create_internal_agents
+
+        def create_counted_agents(*args, **kwargs):
+            checking_agent, selection_agent = create_internal_agents(*args, **kwargs)
+            selection_agents.append(selection_agent)
+            if cache_session is not None:
+                initiate_chat = checking_agent.initiate_chat
+                checking_agent.initiate_chat = lambda *a, **kw: initiate_chat(*a, **{**kw, "cache": cache_session})
+            return checking_agent, selection_agent
+
+        groupchat._create_internal_agents = create_counted_agents
+        select_speaker = groupchat.select_speaker
+
+        def traced_select_speaker(*args, **kwargs):
+            new_agents = len(selection_agents)
+            with span("select_speaker", "manager", agent="Autogen_Agents_Manager") as attrs:
+                try:
+                    return select_speaker(*args, **kwargs)
+                finally:
+                    usage = [_token_usage(agent) for agent in selection_agents[new_agents:]]
+                    attrs["prompt_tokens"] = sum(prompt for prompt, _ in usage)
+                    attrs["completion_tokens"] = sum(completion for _, completion in usage)
+                    # Nur der Client (Usage) wird noch gebraucht, nicht der Verlauf
+                    for agent in selection_agents[new_agents:]:
+                        agent.clear_history()
+
+        groupchat.select_speaker = traced_select_speaker
+        # Fortschrittskontrolle: bricht bei Wiederholungen, Stillstand im Repo oder wiederholten Fehlern ab
+        monitor = ChatMonitor(self.current_dir or None) if self.stall_detection else None
+
+        def should_stop(msg):
+            if is_termination_msg(msg):
+                return True
+            # Von außen abgebrochen (Task-Timeout): nach der aktuellen Nachricht beenden
+            if stop_event is not None and stop_event.is_set():
+                return True
+            return monitor is not None and monitor.check(groupchat.messages)
 
-    def assign_task(self, task: str, max_rounds: int = 5):
-        groupchat = GroupChat(agents=[self.user_proxy] + self.agents, messages=[], max_round=max_rounds)
         self.manager = GroupChatManager(
             groupchat=groupchat,
             name="Autogen_Agents_Manager",
@@ -193,40 +429,68 @@ class AutogenAgents:
 
             ),
             max_consecutive_auto_reply=max_rounds,
-            llm_config=self.llm_config,
+            llm_config=self.config_for("speaker_selection"),
             human_input_mode="NEVER",
-            is_termination_msg=lambda msg: "TERMINATE" in msg["content"].upper(),
+            is_termination_msg=should_stop,
         )
-        chat = self.user_proxy.initiate_chat(self.manager, message=task, max_turns=max_rounds)
-        self.last_chat_cost = chat.cost
-        return chat.cost
+
+        participants = [self.user_proxy] + self.agents + [self.manager]
+        for agent in participants:
+            agent.register_hook("process_message_before_send", transcript.process_message)
+
+        try:
+            self.user_proxy.initiate_chat(self.manager, message=task, max_turns=max_rounds, cache=cache_session)
+        finally:
+            transcript.close()
+            self.last_transcript_stats = transcript.stats()
+        # chat.cost enthält nur User und Manager – Planner, Coder und die Sprecherauswahl mitzählen
+        self.last_chat_cost = gather_usage_summary([self.user_proxy] + self.agents + [self.manager] + selection_agents)
+        self.last_cache_stats = cache_session.stats() if cache_session else None
+        self.last_stop_reason = monitor.stop_reason if monitor else None
+        if stop_event is not None and stop_event.is_set():
+            self.last_stop_reason = "cancelled: task timeout"
+        self.last_speaker_stats = schedule.stats() if schedule else None
+        if self.last_stop_reason:
+            print(f"Chat stopped early: {self.last_stop_reason}")
+        # Der Verlauf steht im Transkript – im Speicher wird er nach dem Chat nicht mehr gebraucht
+        for agent in participants:
+            agent.clear_history()
+        groupchat.messages.clear()
+        self.manager = None
+        return self.last_chat_cost
         
     def get_token_usage(self):
         return self.last_chat_cost
-        # if self.last_chat:
-        #     try:
-        #         with open("info.log", "w", encoding="utf-8") as log:   
-        #             log.write(f"Info\n") 
-        #         cost_info = self.last_chat_cost
-        #         with open("info.log", "a", encoding="utf-8") as log:   
-        #             log.write(f"cost: {cost_info}\n") 
-        #         usage = cost_info.get("usage_including_cached_inference")
-        #         if usage: 
-        #             # ggf. erster Model-Eintrag extrahieren
-        #             model_key = next( iter(usage) ) 
-        #             model_usage = usage[model_key]
-        #             with open("info.log", "a", encoding="utf-8") as log:   
-        #                 log.write(f"usage: {usage}\n") 
-        #             return {
-        #                 "model": model_key,
-        #                 "prompt_tokens": model_usage.get("prompt_tokens", 0),
-        #                 "completion_tokens": model_usage.get("completion_tokens", 0),
-        #                 "total_tokens": model_usage.get("total_tokens", 0),
-        #                 "total_cost": model_usage.get("cost", 0.0)
-        #             }
-        #     except Exception as e:
-        #         print(f"Failed to extract cost info: {e}")
-        #         return None
-    
-        # print("No chat session available to extract token usage.")
-        # return None
\ No newline at end of file
+
+    def get_stop_reason(self):
+        return self.last_stop_reason
+
+    def get_cache_stats(self):
+        return self.last_cache_stats
+
+    def get_speaker_stats(self):
+        return self.last_speaker_stats
+
+    def get_history_stats(self):
+        return self.history_compactor.stats() if self.history_compactor else None
+
+    def get_transcript_stats(self):
+        return self.last_transcript_stats
+
+    def close(self):
+        # Eigenen Container sofort stoppen, statt ihn bis zum Prozessende laufen zu lassen
+        if self._owns_executor and self.executor is not None:
+            self.executor.stop()
+        elif self.executor is not None:
+            # Gepoolter Executor: Tracing-Wrapper entfernen, sonst verschachtelt er sich mit jedem Task weiter
+            vars(self.executor).pop("execute_code_blocks", None)
+        self.executor = None
+        # Agents, Tools und Manager verweisen zyklisch aufeinander (Hooks, Tracing-Wrapper, registrierte
+        # Funktionen) – explizit lösen und sofort einsammeln, statt auf die seltene Gen-2-Collection zu warten
+        for agent in filter(None, [self.user_proxy] + self.agents):
+            agent.clear_history()
+        self.agents = []
+        self.planner_agent = self.coding_agent = self.user_proxy = self.manager = None
+        for tool in ("patch_tool", "search_tool", "file_tool", "list_dir_tool", "git_tool"):
+            self.__dict__.pop(tool, None)
+        gc.collect()
@@ -0,0 +1,341 @@
+"""Offline benchmark of the pipeline overhead (``python benchmark.py``).
+
+Runs ``main.py`` end to end against local stand-ins for everything external:
+
+- a scripted OpenAI-compatible LLM server (Planner greps and plans, Coder edits one file,
+  everyone else answers ``TERMINATE``),
+- stub task and test services (ports 8081/8082 in production),
+- small git fixture repositories as upstreams,
+- code execution on the host (``--local-executor``) instead of Docker.
+
+Each concurrency level runs in its own temporary working directory and reports throughput
+(instances/min), stage latency percentiles and the peak RSS of the pipeline process. With
+``--baseline`` the results are compared against an earlier ``--output`` file and the exit code
+is 1 if throughput dropped or a stage got slower by more than ``--tolerance``.
+
+Token counting for the history budget needs the tiktoken encodings, which tiktoken downloads on
+first use. The default ``--pipeline-args`` therefore disable the budget (``--context-budget 0``);
+to benchmark with it, cache the encodings via ``TIKTOKEN_CACHE_DIR`` and pass other arguments.
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.server
+
+from results_store import load_results, summarize
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LEVELS = "1,2,4"
+DEFAULT_INSTANCES = 8
+DEFAULT_REPOS = 2
+# Ohne Token-Budget braucht main.py keine tiktoken-Encodings (Download) – läuft offline
+DEFAULT_PIPELINE_ARGS = "--context-budget 0"
+# Verhältnis zur Baseline, ab dem der Vergleich fehlschlägt
+DEFAULT_TOLERANCE = 0.2
+
+FIXTURE_MODULE = '''def add(a, b):
+    return a + b
+
+
+def scale(values, factor):
+    return [v * factor for v in values]
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def increment(self):
+        self.count += 1
+        return self.count
+'''
+
+
+def _git(args, cwd):
+    subprocess.run(["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost"] + args, cwd=cwd,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def create_fixtures(root: str, count: int, modules: int = 20):
+    """Create ``count`` small upstream repositories; return ``[(path, commit)]``."""
+    fixtures = []
+    for n in range(count):
+        path = os.path.join(root, f"fixture_{n}")
+        os.makedirs(os.path.join(path, "pkg"), exist_ok=True)
+        for m in range(modules):
+            with open(os.path.join(path, "pkg", f"module_{m}.py"), "w", encoding="utf-8") as f:
+                f.write(FIXTURE_MODULE.replace("def add", f"def add_{m}"))
+        _git(["init", "-q"], path)
+        _git(["add", "."], path)
+        _git(["commit", "-q", "-m", "fixture"], path)
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, check=True, stdout=subprocess.PIPE,
+                                text=True).stdout.strip()
+        fixtures.append((path, commit))
+    return fixtures
+
+
+def _tool_call(name, arguments, number):
+    return {"id": f"call_{number}", "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+def scripted_reply(body: dict) -> dict:
+    """The mock LLM: picks a canned answer from the system prompt and the tools already called."""
+    messages = body.get("messages") or []
+    system = next((str(m.get("content")) for m in messages if m.get("role") == "system"), "")
+    called = {t["function"]["name"] for m in messages for t in m.get("tool_calls") or []}
+    tools = {t["function"]["name"] for t in body.get("tools") or []}
+
+    if "acting as the Planner Agent" in system:
+        if "grep" in tools and "grep" not in called:
+            return {"tool_calls": [_tool_call("grep", {"pattern": "def add_0"}, len(messages))]}
+        return {"content": "Plan:\n1. In `pkg/module_0.py`, make `add_0` subtract instead of add."}
+    if "acting as the Coding Agent" in system:
+        if "replace_in_file" in tools and "replace_in_file" not in called:
+            return {"tool_calls": [_tool_call("replace_in_file", {
+                "path": "pkg/module_0.py", "search": "def add_0(a, b):\n    return a + b",
+                "replace": "def add_0(a, b):\n    return a - b"}, len(messages))]}
+        return {"content": "The change is done. TERMINATE"}
+    if "select the next role" in json.dumps(messages[-1:]):
+        return {"content": "Coding_Agent"}
+    return {"content": "TERMINATE"}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BenchStub"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        stubs = self.server.stubs
+        if self.path.startswith("/task/index/"):
+            index = int(self.path.rstrip("/").split("/")[-1])
+            return self._json(200, stubs.task(index))
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        stubs = self.server.stubs
+        body = self._body()
+        if self.path.endswith("/chat/completions"):
+            time.sleep(stubs.llm_latency)
+            return self._json(200, stubs.completion(body))
+        if self.path.startswith("/test"):
+            time.sleep(stubs.test_latency)
+            return self._json(200, stubs.test_result(body))
+        self._json(404, {"error": "not found"})
+
+
+class StubServices:
+    """Mock LLM, task and test service on one local HTTP server."""
+
+    def __init__(self, fixtures, llm_latency: float = 0.0, test_latency: float = 0.0):
+        self.fixtures = fixtures
+        self.llm_latency = llm_latency
+        self.test_latency = test_latency
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stubs = self
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="bench-stubs", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def task(self, index: int) -> dict:
+        path, commit = self.fixtures[index % len(self.fixtures)]
+        return {
+            "instance_id": f"bench__fixture-{index}",
+            "Problem_statement": f"add_0 in pkg/module_0.py must subtract (benchmark instance {index}).",
+            "git_clone": f"git clone {path} repo && cd repo && git checkout {commit}",
+            "FAIL_TO_PASS": json.dumps(["tests/test_module.py::test_add"]),
+            "PASS_TO_PASS": json.dumps(["tests/test_module.py::test_scale"]),
+        }
+
+    def completion(self, body: dict) -> dict:
+        with self._lock:
+            self.llm_calls += 1
+        message = {"role": "assistant", "content": None, **scripted_reply(body)}
+        prompt_tokens = len(json.dumps(body.get("messages"))) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-bench-{self.llm_calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def test_result(self, body: dict) -> dict:
+        status = {
+            "FAIL_TO_PASS": {"success": body.get("FAIL_TO_PASS", []), "failure": []},
+            "PASS_TO_PASS": {"success": body.get("PASS_TO_PASS", []), "failure": []},
+        }
+        return {"harnessOutput": json.dumps({body["instance_id"]: {"tests_status": status}})}
+
+
+def run_level(stubs: StubServices, workers: int, instances: int, work_root: str, pipeline_args=()) -> dict:
+    """Run ``main.py`` once with ``workers`` workers in a fresh working directory."""
+    level_dir = os.path.join(work_root, f"workers_{workers}")
+    os.makedirs(level_dir, exist_ok=True)
+    # main.py liest den API-Key aus config.py, die nicht im Repo liegt
+    with open(os.path.join(level_dir, "config.py"), "w", encoding="utf-8") as f:
+        f.write('OPENAI_API_KEY = "benchmark"\n')
+
+    env = os.environ.copy()
+    env.update({
+        "LLM_BASE_URL": f"{stubs.url}/v1",
+        "TASK_API_URL": f"{stubs.url}/task/index/",
+        "TEST_API_URL": f"{stubs.url}/test",
+        "PYTHONPATH": os.pathsep.join(filter(None, [level_dir, env.get("PYTHONPATH")])),
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    command = [sys.executable, os.path.join(PACKAGE_DIR, "main.py"),
+               "--tasks", f"0-{instances - 1}", "--workers", str(workers), "--local-executor",
+               "--no-llm-cache", "--fresh", *pipeline_args]
+    calls_before = stubs.llm_calls
+    start = time.perf_counter()
+    with open(os.path.join(level_dir, "pipeline.log"), "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, cwd=level_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 liefert die Ressourcen genau dieses Kindprozesses (ru_maxrss in KiB unter Linux)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start
+
+    records = load_results(os.path.join(level_dir, "logs", "results.jsonl"))
+    summary = summarize(records)
+    return {
+        "workers": workers,
+        "instances": summary["instances"],
+        "evaluated": summary["evaluated"],
+        "errors": summary["errors"],
+        "exit_code": process.returncode,
+        "wall_time": round(elapsed, 3),
+        "instances_per_min": round(summary["instances"] / elapsed * 60, 2) if elapsed else 0.0,
+        "llm_calls": stubs.llm_calls - calls_before,
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "timings": summary["timings"],
+    }
+
+
+def compare(results, baseline, tolerance: float = DEFAULT_TOLERANCE):
+    """Return a list of regressions of ``results`` against ``baseline`` (same JSON layout)."""
+    regressions = []
+    previous = {level["workers"]: level for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        old = previous.get(level["workers"])
+        if not old:
+            continue
+        workers = level["workers"]
+        if level["instances_per_min"] < old["instances_per_min"] * (1 - tolerance):
+            regressions.append(f"workers={workers}: throughput {level['instances_per_min']}/min "
+                               f"(baseline {old['instances_per_min']}/min)")
+        for stage, timing in level["timings"].items():
+            old_timing = old["timings"].get(stage)
+            # Sehr kurze Stufen schwanken zu stark für einen relativen Vergleich
+            if old_timing and timing["p90"] > 0.05 and timing["p90"] > old_timing["p90"] * (1 + tolerance):
+                regressions.append(f"workers={workers}: {stage} p90 {timing['p90']:.3f}s "
+                                   f"(baseline {old_timing['p90']:.3f}s)")
+    return regressions
+
+
+def print_results(results, out=sys.stdout):
+    out.write(f"{'workers':>8}{'inst':>6}{'errors':>8}{'wall s':>10}{'inst/min':>10}{'LLM calls':>11}{'peak MB':>10}\n")
+    for level in results["levels"]:
+        out.write(f"{level['workers']:>8}{level['instances']:>6}{sum(level['errors'].values()):>8}"
+                  f"{level['wall_time']:>10.2f}{level['instances_per_min']:>10.2f}{level['llm_calls']:>11}"
+                  f"{level['peak_rss_mb']:>10.1f}\n")
+    for level in results["levels"]:
+        out.write(f"\nworkers={level['workers']}\n{'Stage':<16}{'mean':>10}{'p50':>10}{'p90':>10}{'max':>10}\n")
+        for stage, t in sorted(level["timings"].items()):
+            out.write(f"{stage:<16}{t['mean']:>10.3f}{t['p50']:>10.3f}{t['p90']:>10.3f}{t['max']:>10.3f}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against mock LLM/task/test services.")
+    parser.add_argument("--levels", default=DEFAULT_LEVELS, help="Comma-separated worker counts (default: 1,2,4)")
+    parser.add_argument("--instances", type=int, default=DEFAULT_INSTANCES, help="Instances per level")
+    parser.add_argument("--repos", type=int, default=DEFAULT_REPOS, help="Fixture repositories shared by the instances")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--test-latency", type=float, default=0.0, help="Simulated seconds per test run")
+    parser.add_argument("--pipeline-args", default=DEFAULT_PIPELINE_ARGS,
+                        help="Extra arguments for main.py, e.g. '--speaker-selection auto' "
+                             f"(default: '{DEFAULT_PIPELINE_ARGS}', works offline)")
+    parser.add_argument("--work-dir", help="Keep all benchmark files here instead of a temporary directory")
+    parser.add_argument("--output", help="Write the results as JSON (usable as --baseline later)")
+    parser.add_argument("--baseline", help="Fail if results regressed against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative regression against the baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    work_root = args.work_dir or tempfile.mkdtemp(prefix="autogen-bench-")
+    os.makedirs(work_root, exist_ok=True)
+    stubs = None
+    try:
+        fixtures = create_fixtures(os.path.join(work_root, "upstream"), max(1, args.repos))
+        stubs = StubServices(fixtures, args.llm_latency, args.test_latency).start()
+        levels = [int(n) for n in args.levels.split(",") if n.strip()]
+        results = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "instances": args.instances,
+            "llm_latency": args.llm_latency,
+            "test_latency": args.test_latency,
+            "pipeline_args": args.pipeline_args,
+            "levels": [],
+        }
+        for workers in levels:
+            print(f"Benchmarking {args.instances} instance(s) with {workers} worker(s)...")
+            results["levels"].append(run_level(stubs, workers, args.instances, work_root,
+                                               shlex.split(args.pipeline_args)))
+    finally:
+        if stubs:
+            stubs.stop()
+        if not args.work_dir:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [level["workers"] for level in results["levels"] if level["exit_code"] or level["errors"]]
+    if failed:
+        print(f"\nPipeline errors at workers={failed} (see pipeline.log with --work-dir)")
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\nRegressions:\n  " + "\n  ".join(regressions) if regressions else "\nNo regressions against baseline.")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import re
+import copy
+import hashlib
+import threading
+
+from autogen.token_count_utils import count_token
+
+# Token-Budget für den Verlauf, den jeder Agent pro LLM-Call mitschickt
+DEFAULT_CONTEXT_BUDGET = 24000
+# Die letzten Nachrichten bleiben immer vollständig erhalten
+KEEP_RECENT_MESSAGES = 4
+# Größere Code-/Dateiblöcke in älteren Nachrichten werden auf Anfang und Ende gekürzt
+MAX_BLOCK_LINES = 40
+
+_CODE_BLOCK = re.compile(r"```[^\n]*\n.*?```", re.DOTALL)
+
+
+class HistoryCompactor:
+    """Message transform that keeps the chat history below a token budget.
+
+    Applied to every LLM call (via autogen's ``TransformMessages`` capability):
+
+    1. identical code/file blocks that were sent again later are replaced by a short
+       reference, only the most recent copy is kept;
+    2. if the history is still over budget, large blocks in older messages are cut down
+       to their first and last lines;
+    3. if that is not enough, the oldest turns (after the task message) are dropped and
+       replaced by a note.
+
+    System messages, the task message and the last ``keep_recent`` messages are never changed.
+    """
+
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_BUDGET, keep_recent: int = KEEP_RECENT_MESSAGES,
+                 max_block_lines: int = MAX_BLOCK_LINES, model: str = "gpt-4o"):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_block_lines = max_block_lines
+        self.model = model
+        self._lock = threading.Lock()
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _message_tokens(self, message) -> int:
+        content = message.get("content")
+        tokens = count_token(content, self.model) if isinstance(content, str) else 0
+        # Argumente der Tool-Calls (z. B. ganze Dateiinhalte bei Edits) gehen ebenfalls an das LLM
+        for call in message.get("tool_calls") or []:
+            function = call.get("function") or {}
+            tokens += count_token(f"{function.get('name', '')}{function.get('arguments', '')}", self.model)
+        return tokens
+
+    def _tokens(self, messages) -> int:
+        return sum(self._message_tokens(m) for m in messages)
+
+    def _protected(self, messages):
+        # Systemnachrichten, erste Task-Nachricht und die letzten keep_recent Nachrichten
+        first = next((i for i, m in enumerate(messages) if m.get("role") != "system"), len(messages))
+        recent = max(first + 1, len(messages) - self.keep_recent)
+        # Tool-Antworten nie von ihrem Tool-Call trennen (die API lehnt verwaiste Antworten ab)
+        while recent > first + 1 and messages[recent].get("role") == "tool":
+            recent -= 1
+        return first, recent
+
+    def _dedupe(self, messages, first, recent):
+        # Von neu nach alt: die jüngste Kopie eines Blocks bleibt, ältere werden ersetzt
+        seen = {}
+        for i in range(len(messages) - 1, first, -1):
+            content = messages[i].get("content")
+            if not isinstance(content, str):
+                continue
+            author = messages[i].get("name", messages[i].get("role", "an agent"))
+
+            def replace(match):
+                block = match.group(0)
+                if block.count("\n") < 5:
+                    return block
+                digest = hashlib.sha1(block.encode("utf-8")).hexdigest()
+                if digest in seen and i < recent:
+                    return f"[identical block omitted – see the later message from {seen[digest]}]"
+                seen.setdefault(digest, author)
+                return block
+
+            messages[i]["content"] = _CODE_BLOCK.sub(replace, content)
+
+    def _truncate_blocks(self, message):
+        content = message.get("content")
+        if not isinstance(content, str):
+            return
+
+        def shorten(match):
+            lines = match.group(0).split("\n")
+            if len(lines) <= self.max_block_lines:
+                return match.group(0)
+            head = self.max_block_lines // 2
+            tail = self.max_block_lines - head
+            omitted = len(lines) - head - tail
+            return "\n".join(lines[:head] + [f"[... {omitted} lines omitted ...]"] + lines[-tail:])
+
+        message["content"] = _CODE_BLOCK.sub(shorten, content)
+
+    def apply_transform(self, messages):
+        messages = copy.deepcopy(messages)
+        before = self._tokens(messages)
+        first, recent = self._protected(messages)
+
+        self._dedupe(messages, first, recent)
+        sizes = [self._message_tokens(m) for m in messages]
+        if sum(sizes) > self.max_tokens:
+            for i in range(first + 1, recent):
+                self._truncate_blocks(messages[i])
+                sizes[i] = self._message_tokens(messages[i])
+
+        dropped = 0
+        while sum(sizes) > self.max_tokens and first + 1 < recent:
+            # Tool-Call zusammen mit seinen Antworten entfernen
+            end = first + 2
+            while end < recent and messages[end].get("role") == "tool":
+                end += 1
+            del messages[first + 1:end]
+            del sizes[first + 1:end]
+            recent -= end - first - 1
+            dropped += end - first - 1
+        if dropped:
+            messages.insert(first + 1, {
+                "role": "user",
+                "name": "History",
+                "content": f"[{dropped} earlier message(s) were removed to stay within the context budget.]",
+            })
+
+        after = self._tokens(messages)
+        with self._lock:
+            self.tokens_in += before
+            self.tokens_out += after
+        return messages
+
+    def get_logs(self, pre_transform_messages, post_transform_messages):
+        before = self._tokens(pre_transform_messages)
+        after = self._tokens(post_transform_messages)
+        if after < before:
+            return f"History compacted from {before} to {after} tokens.", True
+        return "History within budget.", False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"history_tokens_in": self.tokens_in, "history_tokens_saved": self.tokens_in - self.tokens_out}
@@ -0,0 +1,117 @@
+import re
+import difflib
+import hashlib
+import subprocess
+
+# Ab dieser Ähnlichkeit gilt eine Nachricht als Wiederholung einer früheren desselben Agents
+REPEAT_SIMILARITY = 0.95
+MAX_REPEATS = 2
+# So viele Runden ohne Änderung im Repo, bevor abgebrochen wird
+MAX_IDLE_TURNS = 5
+# So viele fehlgeschlagene Code-Ausführungen/Tool-Aufrufe in Folge
+MAX_EXEC_ERRORS = 3
+
+_EXIT_CODE = re.compile(r"^exitcode:\s*(-?\d+)")
+_TOOL_ERRORS = ("Edit rejected", "Patch rejected", "Error ")
+
+
+def _normalize(content: str) -> str:
+    return " ".join(content.split()).lower()
+
+
+class ChatMonitor:
+    """Watches the group chat for lack of progress and reports why it should stop.
+
+    ``stop_reason`` has the form ``"<category>: <detail>"``.
+
+    Checked after every message via the manager's ``is_termination_msg``. It stops when
+
+    - an agent sends (almost) one of its earlier messages ``max_repeats`` times in a row,
+    - the repository did not change during ``max_idle_turns`` turns after the first edit,
+    - ``max_exec_errors`` code executions or tool calls in a row failed.
+    """
+
+    def __init__(self, repo_dir: str = None, repeat_similarity: float = REPEAT_SIMILARITY,
+                 max_repeats: int = MAX_REPEATS, max_idle_turns: int = MAX_IDLE_TURNS,
+                 max_exec_errors: int = MAX_EXEC_ERRORS):
+        self.repo_dir = repo_dir
+        self.repeat_similarity = repeat_similarity
+        self.max_repeats = max_repeats
+        self.max_idle_turns = max_idle_turns
+        self.max_exec_errors = max_exec_errors
+        self.stop_reason = None
+        self._seen = 0
+        self._history = {}  # Agent -> bisherige normalisierte Nachrichten
+        self._repeats = {}  # Agent -> Wiederholungen in Folge
+        self._exec_errors = 0
+        self._last_snapshot = None
+        self._edited = False
+        self._idle_turns = 0
+
+    def _snapshot(self):
+        # Zustand des Arbeitsverzeichnisses: Status (inkl. neuer Dateien) + Hash des Diffs
+        status = subprocess.run(["git", "status", "--porcelain"], cwd=self.repo_dir, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, timeout=30).stdout
+        diff = subprocess.run(["git", "diff"], cwd=self.repo_dir, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=30).stdout
+        return hashlib.sha1(status + b"\0" + diff).hexdigest()
+
+    def _is_repeat(self, name, content) -> bool:
+        normalized = _normalize(content)
+        previous = self._history.setdefault(name, [])
+        repeat = any(
+            p == normalized or difflib.SequenceMatcher(None, p, normalized).ratio() >= self.repeat_similarity
+            for p in previous[-5:]
+            if abs(len(p) - len(normalized)) <= len(normalized) * (1 - self.repeat_similarity) + 1
+        )
+        previous.append(normalized)
+        return repeat
+
+    def _failed(self, message, content):
+        """True/False for a failed/successful code execution or tool call, None for other messages."""
+        if message.get("role") == "tool" or message.get("tool_responses"):
+            responses = [str(r.get("content", "")) for r in message.get("tool_responses") or []] or [content]
+            return any(r.startswith(_TOOL_ERRORS) for r in responses)
+        match = _EXIT_CODE.match(content.strip())
+        if match:
+            return int(match.group(1)) != 0
+        return None
+
+    def _observe(self, message):
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "\n".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+
+        failed = self._failed(message, content)
+        if failed is not None:
+            self._exec_errors = self._exec_errors + 1 if failed else 0
+            if self._exec_errors >= self.max_exec_errors:
+                return f"execution_errors: {self._exec_errors} failed executions in a row"
+        elif content.strip():
+            name = message.get("name", "unknown")
+            # Pro Agent zählen; eine neue Nachricht des Agents setzt den Zähler zurück
+            self._repeats[name] = self._repeats.get(name, 0) + 1 if self._is_repeat(name, content) else 0
+            if self._repeats[name] >= self.max_repeats:
+                return f"repeated_message: {name} repeated itself"
+
+        if self.repo_dir:
+            try:
+                snapshot = self._snapshot()
+            except Exception:
+                return None
+            if self._last_snapshot is not None and snapshot != self._last_snapshot:
+                self._edited = True
+                self._idle_turns = 0
+            elif self._edited:
+                self._idle_turns += 1
+                if self._idle_turns >= self.max_idle_turns:
+                    return f"no_file_changes: no file changes in {self._idle_turns} turns"
+            self._last_snapshot = snapshot
+        return None
+
+    def check(self, messages) -> bool:
+        """Process all messages not seen yet; return True if the chat should stop."""
+        while self.stop_reason is None and self._seen < len(messages):
+            self.stop_reason = self._observe(messages[self._seen])
+            self._seen += 1
+        return self.stop_reason is not None
@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import time
+import threading
+
+CHECKPOINT_FILE = os.path.abspath(os.path.join('logs', 'checkpoint.json'))
+
+# Reihenfolge der Pipeline-Stufen; eine Instanz setzt nach Absturz hinter der letzten erreichten Stufe fort
+STAGES = ["fetched", "repo_ready", "chat_done", "committed", "evaluated"]
+
+
+def _write_json(path: str, data):
+    # Atomar: temporäre Datei + os.replace, ein Absturz hinterlässt nie eine halb geschriebene Datei
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """Manifest of the pipeline stage each instance has reached, keyed by ``instance_id``.
+
+    The whole manifest is rewritten atomically (temp file + ``os.replace``) on every update,
+    so a crash never leaves a half-written checkpoint behind. The fetched test cases (problem
+    statement, test lists) are large and never change, so they are stored once per instance
+    in ``testcase_dir`` instead of in the manifest.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_FILE, testcase_dir: str = None):
+        self.path = path
+        self.testcase_dir = testcase_dir or f"{os.path.splitext(path)[0]}_testcases"
+        self._lock = threading.Lock()
+        self.instances = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.instances = json.load(f).get("instances", {})
+        # Ältere Manifeste enthielten die Test Cases – auslagern, damit sie nicht bei jedem Update mitgeschrieben werden
+        for instance_id, entry in self.instances.items():
+            if "testcase" in entry:
+                self.save_testcase(instance_id, entry.pop("testcase"))
+
+    def _testcase_path(self, instance_id: str) -> str:
+        return os.path.join(self.testcase_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", instance_id) + ".json")
+
+    def save_testcase(self, instance_id: str, testcase: dict):
+        _write_json(self._testcase_path(instance_id), testcase)
+
+    def load_testcase(self, instance_id: str):
+        """The stored test case of an instance, ``None`` if it was not fetched yet."""
+        if not instance_id:
+            return None
+        try:
+            with open(self._testcase_path(instance_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get(self, instance_id: str) -> dict:
+        with self._lock:
+            return dict(self.instances.get(instance_id, {}))
+
+    def find_by_index(self, index: int):
+        with self._lock:
+            for instance_id, entry in self.instances.items():
+                if entry.get("index") == index:
+                    return instance_id, dict(entry)
+        return None, {}
+
+    def reached(self, instance_id: str, stage: str) -> bool:
+        current = self.get(instance_id).get("stage")
+        return current is not None and STAGES.index(current) >= STAGES.index(stage)
+
+    def update(self, instance_id: str, stage: str = None, **data):
+        if stage is not None and stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        with self._lock:
+            entry = self.instances.setdefault(instance_id, {})
+            entry.update(data)
+            if stage is not None:
+                entry["stage"] = stage
+            entry["updated_at"] = time.time()
+            self._save()
+
+    def reset(self, instance_id: str, stage: str = None):
+        """Forget progress of an instance, or roll it back to ``stage``."""
+        with self._lock:
+            if stage is None:
+                self.instances.pop(instance_id, None)
+                try:
+                    os.unlink(self._testcase_path(instance_id))
+                except FileNotFoundError:
+                    pass
+            elif instance_id in self.instances:
+                self.instances[instance_id]["stage"] = stage
+            self._save()
+
+    def _save(self):
+        _write_json(self.path, {"instances": self.instances})
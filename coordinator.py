@@ -0,0 +1,179 @@
+"""Coordinator for distributed runs: hands out task indices to worker nodes.
+
+Start it on one machine and point the workers (``main.py --coordinator http://<host>:8090``) at it::
+
+    python coordinator.py --tasks 1-300 --port 8090
+
+Workers lease one index per free slot, renew the lease while the task runs and send the
+result record, their checkpoint entry and the gzip patch back. Indices of workers that stop
+sending heartbeats are requeued. Results, patches and checkpoint end up in this machine's
+``logs/`` as if the run had been local; the queue (``logs/work_queue.sqlite``) survives a restart.
+"""
+import gzip
+import base64
+import asyncio
+import hashlib
+import argparse
+import contextlib
+from aiohttp import web
+from icecream import ic
+from checkpoint import CHECKPOINT_FILE, Checkpoint
+from patch_store import save_patch
+from results_store import append_result, new_run_id
+from task_indices import parse_task_indices
+from work_queue import DONE, FAILED, LEASE_TTL, LEASED, MAX_ATTEMPTS, PENDING, WORK_QUEUE_FILE, WorkQueue
+
+DEFAULT_PORT = 8090
+STATUS_INTERVAL = 30  # Sekunden zwischen Fortschrittsmeldungen
+# Nach dem letzten Ergebnis noch so lange "done" antworten, damit alle Worker sauber beenden
+SHUTDOWN_GRACE = 15
+
+
+class Coordinator:
+    """HTTP endpoints of the coordinator around a :class:`WorkQueue` (JSON in, JSON out)."""
+
+    def __init__(self, queue: WorkQueue, indices, checkpoint: Checkpoint, run_id: str):
+        self.queue = queue
+        self.indices = indices
+        self.checkpoint = checkpoint
+        self.run_id = run_id
+        self.finished = asyncio.Event()
+
+    def _open(self, counts) -> int:
+        return counts[PENDING] + counts[LEASED]
+
+    async def lease(self, request):
+        body = await request.json()
+        worker = body.get("worker") or request.remote
+        leased = await asyncio.to_thread(self.queue.lease, worker, self.indices)
+        if leased is None:
+            counts = await asyncio.to_thread(self.queue.counts, self.indices)
+            return web.json_response({"index": None, "done": self._open(counts) == 0})
+        index, lease_id = leased
+        print(f"Leased test case {index} to {worker}")
+        return web.json_response({"index": index, "lease_id": lease_id, "lease_ttl": self.queue.lease_ttl})
+
+    async def heartbeat(self, request):
+        body = await request.json()
+        ok = await asyncio.to_thread(self.queue.heartbeat, body["index"], body["lease_id"])
+        return web.json_response({"ok": ok})
+
+    async def release(self, request):
+        body = await request.json()
+        await asyncio.to_thread(self.queue.release, body["index"], body["lease_id"])
+        return web.json_response({"ok": True})
+
+    def _store(self, body):
+        entry = dict(body.get("checkpoint") or {})
+        instance_id = body.get("instance_id")
+        if body.get("patch"):
+            patch = gzip.decompress(base64.b64decode(body["patch"]))
+            if entry.get("patch_sha256") and hashlib.sha256(patch).hexdigest() != entry["patch_sha256"]:
+                raise ValueError(f"patch of {instance_id} does not match its checksum")
+            entry.update(save_patch(instance_id, patch))
+        if instance_id and body.get("testcase"):
+            self.checkpoint.save_testcase(instance_id, body["testcase"])
+        if instance_id and entry:
+            stage = entry.pop("stage", None)
+            entry.pop("updated_at", None)
+            self.checkpoint.update(instance_id, stage, **entry)
+        record = body.get("record")
+        if record:
+            # Ein Lauf über alle Worker: Auswertung mit results_store per Run-ID des Coordinators
+            record["worker_run_id"] = record.get("run_id")
+            record["run_id"] = self.run_id
+            record["worker"] = body.get("worker")
+            append_result(record)
+
+    async def complete(self, request):
+        body = await request.json()
+        index = body["index"]
+        record = body.get("record") or {}
+        # Chat oder Patch-Export gescheitert (keine Evaluation): wie lokal bei einem Neustart erneut versuchen,
+        # als Versuch gezählt – nach max_attempts gilt die Instanz als fehlgeschlagen
+        failed = bool(record.get("error_class")) and not record.get("fail_to_pass")
+        if not await asyncio.to_thread(self.queue.retry if failed else self.queue.complete, index):
+            ic(f"Duplicate result for test case {index} from {body.get('worker')} – ignored.")
+            return web.json_response({"accepted": False})
+        try:
+            await asyncio.to_thread(self._store, body)
+        except Exception as e:
+            # Ergebnis unbrauchbar: Instanz zurück in die Queue (Versuche bleiben gezählt), der Worker bekommt einen Fehler
+            await asyncio.to_thread(self.queue.retry, index)
+            raise web.HTTPBadRequest(text=f"Result of test case {index} rejected: {e}")
+        if failed:
+            print(f"Test case {index} failed on {body.get('worker')} ({record['error_class']}) – "
+                  f"requeued until max attempts.")
+        else:
+            print(f"Test case {index} completed by {body.get('worker')}")
+        if self._open(await asyncio.to_thread(self.queue.counts, self.indices)) == 0:
+            self.finished.set()
+        return web.json_response({"accepted": True})
+
+    async def status(self, request):
+        counts = await asyncio.to_thread(self.queue.counts, self.indices)
+        workers = await asyncio.to_thread(self.queue.workers)
+        return web.json_response({"run_id": self.run_id, "counts": counts, "workers": workers})
+
+    async def watch(self):
+        # Regelmäßig abgelaufene Leases einsammeln und den Fortschritt melden, bis nichts mehr offen ist
+        while not self.finished.is_set():
+            counts = await asyncio.to_thread(self.queue.counts, self.indices)
+            print(f"Queue: {counts[PENDING]} pending, {counts[LEASED]} leased, {counts[DONE]} done, "
+                  f"{counts[FAILED]} failed")
+            if self._open(counts) == 0:
+                self.finished.set()
+                break
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.finished.wait(), STATUS_INTERVAL)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=256 * 1024 ** 2)
+        app.add_routes([
+            web.post("/lease", self.lease),
+            web.post("/heartbeat", self.heartbeat),
+            web.post("/release", self.release),
+            web.post("/complete", self.complete),
+            web.get("/status", self.status),
+        ])
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hand out SWE-Bench-Lite tasks to worker nodes (main.py --coordinator).")
+    parser.add_argument("--tasks", default="1", help="Task indices, e.g. '1-10,15,20-30:5' (default: 1)")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--queue", default=WORK_QUEUE_FILE, help="SQLite file of the durable work queue")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint file the workers' progress is merged into")
+    parser.add_argument("--lease-ttl", type=float, default=LEASE_TTL,
+                        help="Seconds without heartbeat until a task is handed to another worker")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="Leases per task before it is given up (worker crashes)")
+    parser.add_argument("--fresh", action="store_true", help="Queue the selected tasks again even if they are done")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    indices = parse_task_indices(args.tasks)
+    queue = WorkQueue(args.queue, lease_ttl=args.lease_ttl, max_attempts=args.max_attempts)
+    queue.add(indices, reset=args.fresh)
+    run_id = new_run_id()
+    coordinator = Coordinator(queue, indices, Checkpoint(args.checkpoint), run_id)
+
+    runner = web.AppRunner(coordinator.app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Coordinator for {len(indices)} task(s) listening on {args.host}:{args.port}, run id {run_id}")
+    try:
+        await coordinator.watch()
+        await asyncio.sleep(SHUTDOWN_GRACE)
+    finally:
+        await runner.cleanup()
+        queue.close()
+    print(f"All tasks finished – summarize with: python results_store.py --run-id {run_id}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
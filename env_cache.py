@@ -0,0 +1,256 @@
+import os
+import glob
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+from icecream import ic
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from tracing import span
+
+# Unter repos/, damit die Environments im Docker-Mount (/workspace) unter festem Pfad liegen –
+# virtualenvs lassen sich nicht verschieben (absolute Pfade in bin/*)
+ENV_DIR = os.path.abspath(os.path.join('repos', '.envs'))
+ENV_CACHE_MAX_BYTES = 20 * 1024 ** 3  # 20 GB
+ENV_BUILD_TIMEOUT = 30 * 60  # Sekunden
+
+# Dateien, die die Abhängigkeiten eines Projekts festlegen (Globs relativ zum Repo)
+ENV_FILES = [
+    "setup.py",
+    "setup.cfg",
+    "pyproject.toml",
+    "requirements*.txt",
+    "requirements/*.txt",
+    "requirements/*.in",
+]
+
+READY_MARKER = ".ready"
+IN_USE_LOCK = ".in_use"
+
+# Installiert die Abhängigkeiten des Projekts, aber nicht das Projekt selbst – das kommt aus dem jeweiligen
+# Checkout (Arbeitsverzeichnis bzw. PYTHONPATH), damit die Änderungen der Agents wirksam sind.
+BUILD_SCRIPT = """set -e
+python -m venv {env}
+{env}/bin/pip install --quiet --disable-pip-version-check --upgrade pip setuptools wheel
+{requirements}
+if [ -f setup.py ] || [ -f pyproject.toml ]; then
+  {env}/bin/pip install --quiet --disable-pip-version-check --report {env}/.install-report.json .
+  {env}/bin/python - {env}/.install-report.json <<'EOF' | xargs -r {env}/bin/pip uninstall --quiet -y
+import json, sys
+report = json.load(open(sys.argv[1]))
+print(" ".join(i["metadata"]["name"] for i in report["install"] if "dir_info" in i.get("download_info", {{}})))
+EOF
+fi
+{env}/bin/pip install --quiet --disable-pip-version-check pytest
+"""
+
+
+def env_files(repo_dir: str):
+    files = set()
+    for pattern in ENV_FILES:
+        files.update(os.path.relpath(p, repo_dir) for p in glob.glob(os.path.join(repo_dir, pattern)))
+    return sorted(f.replace(os.sep, "/") for f in files)
+
+
+def env_key(repo_url: str, repo_dir: str, tag: str = ""):
+    """Cache key from the repo and the content of its dependency files; ``None`` if it has none."""
+    files = env_files(repo_dir)
+    if not files:
+        return None
+    digest = hashlib.sha256(f"{repo_url}\0{tag}\0".encode("utf-8"))
+    for rel in files:
+        digest.update(rel.encode("utf-8") + b"\0")
+        with open(os.path.join(repo_dir, rel), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    name = repo_url.rstrip("/").split("/")[-1].removesuffix(".git") or "repo"
+    return f"{name}-{digest.hexdigest()[:16]}"
+
+
+def _fingerprint(path: str) -> str:
+    # Dateien des Environments (ohne Bytecode) mit Größe und mtime – erkennt nachträgliche Installationen
+    digest = hashlib.sha256()
+    for current, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(names):
+            if name in (READY_MARKER, IN_USE_LOCK) or name.endswith(".pyc"):
+                continue
+            full = os.path.join(current, name)
+            with contextlib.suppress(OSError):
+                stat = os.lstat(full)
+                digest.update(f"{os.path.relpath(full, path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for current, _, names in os.walk(path):
+        for name in names:
+            with contextlib.suppress(OSError):
+                total += os.lstat(os.path.join(current, name)).st_size
+    return total
+
+
+@contextlib.contextmanager
+def _flock(path: str, mode):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, mode)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+class EnvironmentCache:
+    """Prebuilt virtualenvs with the dependencies of the target repositories, shared by all instances.
+
+    Environments are keyed by :func:`env_key` (repo + hash of ``ENV_FILES``), built once inside
+    the executor (so they match its Python) and reused by every instance with the same key.
+    An environment is held with a shared ``flock`` while a chat uses it; above ``max_bytes``
+    the least recently used environments that are not in use are deleted. Executors get it
+    read-only; :meth:`use` still checks its fingerprint and drops an environment that was changed.
+    Builds are serialized per key across threads and processes.
+    """
+
+    def __init__(self, env_dir: str = ENV_DIR, max_bytes: int = ENV_CACHE_MAX_BYTES,
+                 build_timeout: int = ENV_BUILD_TIMEOUT):
+        self.env_dir = env_dir
+        self.max_bytes = max_bytes
+        self.build_timeout = build_timeout
+        self._failed = set()  # in diesem Prozess fehlgeschlagene Builds nicht bei jeder Instanz wiederholen
+        self._lock = threading.Lock()
+        os.makedirs(env_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.env_dir, key)
+
+    def is_ready(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), READY_MARKER))
+
+    def _touch(self, key: str):
+        # mtime der Ready-Markierung = letzte Nutzung (LRU)
+        with contextlib.suppress(OSError):
+            os.utime(os.path.join(self.path(key), READY_MARKER))
+
+    def ensure(self, repo_url: str, repo_dir: str, builder, tag: str = ""):
+        """Return the key of a ready environment for the checkout in ``repo_dir``, building it if
+        needed in the executor (``run_shell``/``container_path``) that the context manager factory
+        ``builder`` provides; ``None`` if there is nothing to install or the build failed."""
+        key = env_key(repo_url, repo_dir, tag)
+        if key is None:
+            return None
+        if self.is_ready(key):
+            self._touch(key)
+            return key
+        with self._lock:
+            if key in self._failed:
+                return None
+        path = self.path(key)
+        with _flock(f"{path}.build-lock", fcntl.LOCK_EX if fcntl else None):
+            if self.is_ready(key):
+                self._touch(key)
+                return key
+            # Reste eines abgebrochenen oder verworfenen Builds entfernen; gebaut wird direkt am endgültigen
+            # Pfad – ein verworfenes Environment erst, wenn es kein Chat mehr benutzt
+            if os.path.isdir(path):
+                with _flock(os.path.join(path, IN_USE_LOCK), fcntl.LOCK_EX if fcntl else None):
+                    shutil.rmtree(path, ignore_errors=True)
+            ic(f"Building environment {key}...")
+            with span("env_build", "env", key=key), builder() as executor:
+                env = executor.container_path(path)
+                requirements = "".join(
+                    f"{env}/bin/pip install --quiet --disable-pip-version-check -r '{f}'\n"
+                    for f in env_files(repo_dir) if f.startswith("requirements") and f.endswith(".txt")
+                )
+                script = BUILD_SCRIPT.format(env=env, requirements=requirements)
+                exit_code, output = executor.run_shell(script, self.build_timeout)
+            if exit_code != 0:
+                with open(f"{path}.failed.log", "w", encoding="utf-8") as f:
+                    f.write(output)
+                shutil.rmtree(path, ignore_errors=True)
+                with self._lock:
+                    self._failed.add(key)
+                print(f"Building environment {key} failed (exit code {exit_code}), see {path}.failed.log")
+                return None
+            with open(os.path.join(path, READY_MARKER), "w", encoding="utf-8") as f:
+                json.dump({"repo_url": repo_url, "files": env_files(repo_dir), "size": _dir_size(path),
+                           "fingerprint": _fingerprint(path), "built_at": time.time()}, f)
+        self.evict(keep=key)
+        return key
+
+    @contextlib.contextmanager
+    def use(self, key: str):
+        """Hold the environment while a chat runs, so that it is not evicted; yields its path
+        (``None`` if it was evicted in the meantime)."""
+        path = self.path(key)
+        try:
+            fd = os.open(os.path.join(path, IN_USE_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            yield None
+            return
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            self._touch(key)
+            yield path if self._verify(key) else None
+        finally:
+            os.close(fd)
+
+    def _verify(self, key: str) -> bool:
+        # Ein verändertes Environment (z. B. "pip install" eines Agents) nicht weitergeben und neu bauen lassen
+        marker = os.path.join(self.path(key), READY_MARKER)
+        try:
+            with open(marker, "r", encoding="utf-8") as f:
+                expected = json.load(f).get("fingerprint")
+        except (OSError, ValueError):
+            return False
+        if expected is None or _fingerprint(self.path(key)) == expected:
+            return True
+        print(f"Environment {key} was modified after its build – discarding it.")
+        with contextlib.suppress(OSError):
+            os.unlink(marker)
+        return False
+
+    def _entries(self):
+        entries = []
+        for key in os.listdir(self.env_dir):
+            marker = os.path.join(self.path(key), READY_MARKER)
+            try:
+                with open(marker, "r", encoding="utf-8") as f:
+                    size = json.load(f).get("size", 0)
+                entries.append((os.stat(marker).st_mtime, key, size))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries)
+
+    def evict(self, keep: str = None):
+        """Delete least recently used environments until the cache fits into ``max_bytes``."""
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            path = self.path(key)
+            fd = os.open(os.path.join(path, IN_USE_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # wird gerade von einem Chat benutzt
+                ic(f"Evicting environment {key} ({size / 1024 ** 2:.0f} MB).")
+                # Erst die Markierung entfernen, damit niemand ein halb gelöschtes Environment verwendet
+                os.unlink(os.path.join(path, READY_MARKER))
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+            finally:
+                os.close(fd)
@@ -0,0 +1,107 @@
+import json
+import time
+import asyncio
+from icecream import ic
+
+from tracing import set_track, span
+
+# Gleichzeitige Testläufe am SWE-Bench-Service (jeder startet dort einen eigenen Container)
+DEFAULT_EVAL_CONCURRENCY = 2
+
+
+def parse_harness_output(result_raw):
+    result_json = json.loads(result_raw)
+    if not result_json:
+        raise ValueError("No data in harnessOutput – possible evaluation error or empty result")
+    instance_id = next(iter(result_json))
+    tests_status = result_json[instance_id]["tests_status"]
+    counts = {}
+    for key in ("FAIL_TO_PASS", "PASS_TO_PASS"):
+        results = tests_status[key]
+        counts[key] = {
+            "passed": len(results["success"]),
+            "total": len(results["success"]) + len(results["failure"]),
+        }
+    return counts["FAIL_TO_PASS"], counts["PASS_TO_PASS"]
+
+
+class EvaluationQueue:
+    """Evaluation as a separate pipeline stage.
+
+    Tasks hand their job over with :meth:`evaluate` and give their worker slot back while the
+    test run is queued; ``concurrency`` evaluator coroutines submit the jobs to the test service
+    and resolve one future per ``instance_id``. Submitting an instance that is already queued
+    joins the pending run instead of starting a second one.
+
+    ``prepare(slot, job)`` (blocking, run in a thread) turns a job into the test service payload,
+    e.g. by applying the stored patch to the evaluator's own checkout; without it the job is sent as is.
+    """
+
+    def __init__(self, client, concurrency: int = DEFAULT_EVAL_CONCURRENCY, prepare=None):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.prepare = prepare
+        self._queue = asyncio.Queue()
+        self._pending = {}  # instance_id -> Future mit (fail_to_pass, pass_to_pass, queue_wait)
+        self._workers = []
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.concurrency)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, instance_id: str, job: dict) -> asyncio.Future:
+        future = self._pending.get(instance_id)
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._pending[instance_id] = future
+            self._queue.put_nowait((instance_id, job, time.perf_counter(), future))
+        return future
+
+    async def evaluate(self, instance_id: str, job: dict):
+        """Queue ``job`` for the test service; return ``(fail_to_pass, pass_to_pass, queue_wait)``."""
+        self.start()
+        # shield: ein abgebrochener Aufrufer soll den gemeinsamen Testlauf nicht mit abbrechen
+        return await asyncio.shield(self.submit(instance_id, job))
+
+    async def _worker(self, number):
+        # Eigene Spur pro Evaluator im Trace (Task-Spuren sind die Task-Indizes)
+        set_track(-1 - number, f"evaluator {number}")
+        while True:
+            instance_id, job, queued_at, future = await self._queue.get()
+            queue_wait = round(time.perf_counter() - queued_at, 3)
+            try:
+                if self.prepare:
+                    with span("prepare_evaluation", cat="eval", instance_id=instance_id):
+                        payload = await asyncio.to_thread(self.prepare, number, job)
+                else:
+                    payload = job
+                with span("test_service", cat="eval", instance_id=instance_id, queue_wait=queue_wait):
+                    result_raw = await self.client.run_tests(payload)
+                ic(result_raw)
+                fail_to_pass, pass_to_pass = parse_harness_output(result_raw)
+                if not future.done():
+                    future.set_result((fail_to_pass, pass_to_pass, queue_wait))
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                if self._pending.get(instance_id) is future:
+                    del self._pending[instance_id]
+                self._queue.task_done()
@@ -0,0 +1,264 @@
+import os
+import sys
+import queue
+import atexit
+import threading
+import platform
+import subprocess
+import contextlib
+from pathlib import Path
+from types import SimpleNamespace
+from icecream import ic
+
+from autogen.coding import DockerCommandLineCodeExecutor, LocalCommandLineCodeExecutor
+
+from tracing import span
+
+EXECUTOR_IMAGE = "maximiliantoepfer1/autogen-agent"
+EXECUTOR_TIMEOUT = 120
+# Nach so vielen Leases wird ein Container ersetzt, damit sich keine Installationen/Reste ansammeln
+MAX_LEASES_PER_CONTAINER = 20
+# PATH des Executor-Images (python:3.12-slim); ein Environment aus env_cache.py wird davor gesetzt
+CONTAINER_PATH = "/usr/local/bin:/usr/local/sbin:/usr/sbin:/usr/bin:/sbin:/bin"
+# Wegwerf-Schicht für "pip install" der Agents über dem (read-only) Environment; reset() leert /tmp
+PIP_OVERLAY = "/tmp/pip-overlay"
+
+
+class PooledDockerExecutor(DockerCommandLineCodeExecutor):
+    """Docker executor whose container mounts the whole workspace root and can be re-targeted.
+
+    The container is created once with ``root_dir`` bind-mounted at ``/workspace``; each lease
+    points the executor at one checkout below it, so code files are written into that checkout
+    and run with it as working directory.
+
+    Isolation trade-off: mounting the root (instead of one checkout per container) is what lets a
+    warm container serve any task, but code of one task can still write into the checkouts of
+    other tasks running at the same time. Shared state all tasks depend on – the git mirrors and
+    the prebuilt environments, ``read_only_dirs`` below ``root_dir`` – is mounted read-only on top.
+    """
+
+    def __init__(self, root_dir: str, image: str = EXECUTOR_IMAGE, timeout: int = EXECUTOR_TIMEOUT,
+                 read_only_dirs=()):
+        self.root_dir = os.path.abspath(root_dir)
+        volumes = {self.root_dir: {"bind": "/workspace", "mode": "rw"}}
+        for path in read_only_dirs:
+            os.makedirs(path, exist_ok=True)
+            volumes[os.path.abspath(path)] = {"bind": self.container_path(path), "mode": "ro"}
+        super().__init__(image=image, timeout=timeout, work_dir=root_dir,
+                         container_create_kwargs={"volumes": volumes})
+        self.leases = 0
+        self._container_workdir = "/workspace"
+        self._environment = None
+
+        exec_run = self._container.exec_run
+
+        def exec_in_lease(cmd, *args, **kwargs):
+            kwargs.setdefault("workdir", self._container_workdir)
+            if self._environment:
+                kwargs.setdefault("environment", self._environment)
+            return exec_run(cmd, *args, **kwargs)
+
+        self._container.exec_run = exec_in_lease
+
+    def container_path(self, path: str) -> str:
+        rel = os.path.relpath(os.path.abspath(path), self.root_dir)
+        if rel.startswith(".."):
+            raise ValueError(f"{path} is not inside the executor root {self.root_dir}")
+        return "/workspace/" + rel.replace(os.sep, "/")
+
+    def attach(self, repo_dir: str, env_dir: str = None):
+        repo_dir = os.path.abspath(repo_dir)
+        self._container_workdir = self.container_path(repo_dir)
+        self._work_dir = Path(repo_dir)
+        if env_dir:
+            # Vorgebautes virtualenv mit den Abhängigkeiten; das Projekt selbst kommt aus dem Checkout.
+            # Installationen der Agents landen per PIP_TARGET in einer Schicht nur für diesen Lease.
+            env = self.container_path(env_dir)
+            self._environment = {"VIRTUAL_ENV": env, "PATH": f"{PIP_OVERLAY}/bin:{env}/bin:{CONTAINER_PATH}",
+                                 "PYTHONPATH": f"{self._container_workdir}:{PIP_OVERLAY}",
+                                 "PIP_TARGET": PIP_OVERLAY}
+        self.leases += 1
+
+    def run_shell(self, script: str, timeout: int):
+        """Run a shell script in the leased checkout; returns ``(exit_code, output)``."""
+        result = self._container.exec_run(["timeout", str(int(timeout)), "sh", "-c", script])
+        return result.exit_code, result.output.decode("utf-8", errors="replace")
+
+    def reset(self):
+        # Verwaiste Prozesse und temporäre Dateien des letzten Tasks entfernen
+        self._container_workdir = "/workspace"
+        self._work_dir = Path(self.root_dir)
+        self._environment = None
+        self._container.exec_run(["sh", "-c", "kill -9 -1 2>/dev/null; rm -rf /tmp/* 2>/dev/null; true"])
+
+    def is_alive(self) -> bool:
+        try:
+            self._container.reload()
+            return self._container.status == "running"
+        except Exception:
+            return False
+
+
+class ExecutorPool:
+    """Keeps up to ``size`` warm Docker executors and leases one per task.
+
+    ``read_only_dirs`` (below ``root_dir``) are mounted read-only into the pooled containers;
+    only :meth:`builder` containers may write to them.
+    """
+
+    def __init__(self, size: int, root_dir: str, image: str = EXECUTOR_IMAGE, timeout: int = EXECUTOR_TIMEOUT,
+                 max_leases: int = MAX_LEASES_PER_CONTAINER, read_only_dirs=()):
+        self.size = size
+        self.root_dir = os.path.abspath(root_dir)
+        self.read_only_dirs = list(read_only_dirs)
+        self.image = image
+        self.timeout = timeout
+        self.max_leases = max_leases
+        self._idle = queue.Queue()
+        self._all = []
+        self._count = 0  # laufende + gerade startende Container
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.shutdown)
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._count >= self.size:
+                return False
+            self._count += 1
+            return True
+
+    def _create(self) -> PooledDockerExecutor:
+        # Setzt eine Reservierung über _reserve() voraus
+        try:
+            with span("executor_start", "executor", image=self.image):
+                executor = PooledDockerExecutor(self.root_dir, image=self.image, timeout=self.timeout,
+                                                read_only_dirs=self.read_only_dirs)
+        except Exception:
+            with self._lock:
+                self._count -= 1
+            raise
+        with self._lock:
+            self._all.append(executor)
+        return executor
+
+    def _discard(self, executor: PooledDockerExecutor):
+        with self._lock:
+            if executor in self._all:
+                self._all.remove(executor)
+                self._count -= 1
+        try:
+            executor.stop()
+        except Exception as e:
+            print(f"Failed to stop executor container: {e}")
+
+    def warm_up(self):
+        """Start all containers up front instead of on first lease."""
+        while self._reserve():
+            self._idle.put(self._create())
+
+    def _acquire(self) -> PooledDockerExecutor:
+        while True:
+            try:
+                executor = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve():
+                    return self._create()
+                # Alle Container verliehen – warten, bis einer zurückkommt oder ersetzt werden darf
+                try:
+                    executor = self._idle.get(timeout=1)
+                except queue.Empty:
+                    continue
+            if executor.is_alive():
+                return executor
+            ic("Executor container died – replacing it.")
+            self._discard(executor)
+
+    @property
+    def env_tag(self) -> str:
+        # Environments aus env_cache.py passen nur zum Python des Images, in dem sie gebaut wurden
+        return self.image
+
+    @contextlib.contextmanager
+    def lease(self, repo_dir: str, env_dir: str = None):
+        if self._closed:
+            raise RuntimeError("Executor pool is shut down")
+        executor = self._acquire()
+        try:
+            executor.attach(repo_dir, env_dir)
+            yield executor
+        finally:
+            try:
+                executor.reset()
+            except Exception as e:
+                print(f"Failed to reset executor container: {e}")
+                executor.leases = self.max_leases
+            if self._closed or executor.leases >= self.max_leases:
+                self._discard(executor)
+            else:
+                self._idle.put(executor)
+
+    @contextlib.contextmanager
+    def builder(self, repo_dir: str):
+        """Short-lived container outside the pool in which ``read_only_dirs`` are writable,
+        e.g. to build an environment of env_cache.py."""
+        with span("executor_start", "executor", image=self.image, builder=True):
+            executor = PooledDockerExecutor(self.root_dir, image=self.image, timeout=self.timeout)
+        try:
+            executor.attach(repo_dir)
+            yield executor
+        finally:
+            executor.stop()
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            executors = list(self._all)
+        for executor in executors:
+            self._discard(executor)
+
+
+class LocalPoolExecutor(LocalCommandLineCodeExecutor):
+    """Host executor with the ``run_shell``/``container_path`` interface of :class:`PooledDockerExecutor`."""
+
+    def container_path(self, path: str) -> str:
+        return os.path.abspath(path)
+
+    def run_shell(self, script: str, timeout: int):
+        try:
+            result = subprocess.run(["sh", "-c", script], cwd=self.work_dir, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            return 124, (e.output or b"").decode("utf-8", errors="replace")
+        return result.returncode, result.stdout.decode("utf-8", errors="replace")
+
+
+class LocalExecutorPool:
+    """Same interface as :class:`ExecutorPool`, but runs code directly on the host without Docker.
+
+    Only meant for trusted code such as the scripted agents of ``benchmark.py``.
+    """
+
+    def __init__(self, root_dir: str, timeout: int = EXECUTOR_TIMEOUT):
+        self.root_dir = os.path.abspath(root_dir)
+        self.timeout = timeout
+
+    @property
+    def env_tag(self) -> str:
+        return f"local-{platform.machine()}-py{sys.version_info.major}.{sys.version_info.minor}"
+
+    def warm_up(self):
+        pass
+
+    @contextlib.contextmanager
+    def lease(self, repo_dir: str, env_dir: str = None):
+        venv = None
+        if env_dir:
+            venv = SimpleNamespace(bin_path=os.path.join(env_dir, "bin"), env_exe=os.path.join(env_dir, "bin", "python"))
+        yield LocalPoolExecutor(timeout=self.timeout, work_dir=repo_dir, virtual_env_context=venv)
+
+    def builder(self, repo_dir: str):
+        return self.lease(repo_dir)
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,135 @@
+import json
+import random
+import asyncio
+import aiohttp
+from icecream import ic
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 1.0   # Sekunden
+BACKOFF_MAX = 30.0
+
+
+class ServiceError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceClient:
+    """Async JSON client for one service: pooled keep-alive connections, timeouts,
+    retries with exponential backoff and full jitter, and a concurrency limit.
+
+    Use as ``async with`` or call :meth:`close`. Sessions can be shared between clients.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30, retries: int = DEFAULT_RETRIES,
+                 max_concurrency: int = 8, session: aiohttp.ClientSession = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=64, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    async def request_json(self, method: str, path: str, payload=None):
+        url = f"{self.base_url}/{path.lstrip('/')}" if path else self.base_url
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, json=payload, timeout=self.timeout) as response:
+                        text = await response.text()
+                        if response.status < 400:
+                            return json.loads(text) if text else None
+                        retry_after = response.headers.get("Retry-After")
+                        error = ServiceError(f"{method} {url} returned {response.status}: {text[:200]}", response.status)
+                        if response.status not in RETRY_STATUS:
+                            raise error
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = ServiceError(f"{method} {url} failed: {type(e).__name__}: {e}")
+            if attempt < self.retries:
+                delay = self._backoff(attempt, retry_after)
+                ic(f"{error} – retrying in {delay:.1f}s ({attempt + 1}/{self.retries})")
+                await asyncio.sleep(delay)
+        raise error
+
+    async def get_json(self, path: str = ""):
+        return await self.request_json("GET", path)
+
+    async def post_json(self, path: str, payload):
+        return await self.request_json("POST", path, payload)
+
+
+class TaskServiceClient(ServiceClient):
+    """Client for the SWE-Bench-Lite task service (``GET <base>/<index>``)."""
+
+    async def fetch_task(self, index: int) -> dict:
+        return await self.get_json(str(index))
+
+    async def prefetch(self, indices) -> dict:
+        """Fetch many task definitions concurrently; failed indices are left out."""
+        async def fetch(index):
+            try:
+                return index, await self.fetch_task(index)
+            except ServiceError as e:
+                print(f"Prefetching test case {index} failed: {e}")
+                return index, None
+
+        results = await asyncio.gather(*(fetch(i) for i in indices))
+        return {index: task for index, task in results if task is not None}
+
+
+class TestServiceClient(ServiceClient):
+    """Client for the SWE-Bench evaluation service (``POST <base>``)."""
+
+    async def run_tests(self, payload: dict) -> str:
+        result = await self.post_json("", payload)
+        return (result or {}).get("harnessOutput", "{}")
+
+
+class CoordinatorClient(ServiceClient):
+    """Client of a worker node for the coordinator (``coordinator.py``)."""
+
+    def __init__(self, base_url: str, worker: str, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.worker = worker
+
+    async def lease(self) -> dict:
+        return await self.post_json("lease", {"worker": self.worker})
+
+    async def heartbeat(self, index: int, lease_id: str) -> bool:
+        return (await self.post_json("heartbeat", {"index": index, "lease_id": lease_id}) or {}).get("ok", False)
+
+    async def release(self, index: int, lease_id: str):
+        await self.post_json("release", {"index": index, "lease_id": lease_id})
+
+    async def complete(self, index: int, lease_id: str, result: dict) -> bool:
+        payload = dict(result, index=index, lease_id=lease_id, worker=self.worker)
+        return (await self.post_json("complete", payload) or {}).get("accepted", False)
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+LLM_CACHE_FILE = os.path.abspath(os.path.join('.cache', 'llm_responses.sqlite'))
+LLM_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+
+class CacheMissError(RuntimeError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+class LLMCache:
+    """Disk-backed (SQLite) store for LLM responses, shared by all chats of a process.
+
+    Keys are the request keys autogen builds from model, messages and sampling parameters
+    (JSON with sorted keys, or the plain object in ag2), hashed with SHA-256. When the stored responses exceed
+    ``max_bytes`` the least recently used entries are evicted.
+    In ``replay`` mode nothing is written and every miss raises :class:`CacheMissError`.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_FILE, max_bytes: int = LLM_CACHE_MAX_BYTES, replay: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def _hash(key) -> str:
+        # Neuere autogen-Versionen (ag2) liefern den Schlüssel als JSON-fähiges Objekt statt als String
+        if not isinstance(key, str):
+            key = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, default=None):
+        digest = self._hash(key)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (digest,)).fetchone()
+            if row is None:
+                return default
+            if not self.replay:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), digest))
+                self._conn.commit()
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value):
+        if self.replay:
+            return
+        blob = pickle.dumps(value)
+        digest = self._hash(key)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (digest,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, blob, len(blob), now, now),
+            )
+            self._size += len(blob) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Auf 90 % des Limits zurück, damit nicht bei jedem Schreiben evicted wird
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def session(self):
+        return LLMCacheSession(self)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LLMCacheSession:
+    """Per-chat view on an :class:`LLMCache` with its own hit/miss counters.
+
+    Implements autogen's cache protocol (``get``/``set``/context manager), so it can be
+    passed as ``cache=`` to ``initiate_chat``.
+    """
+
+    def __init__(self, cache: LLMCache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default=None):
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+            if self.cache.replay:
+                raise CacheMissError(f"No cached LLM response for request {self.cache._hash(key)[:12]} (replay mode)")
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        self.cache.set(key, value)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        # autogen schließt den Cache nach jedem Request – die geteilte Verbindung bleibt offen
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -3,205 +3,561 @@ import re
 import os
 import sys
 import asyncio
+import threading
+import aiohttp
+import argparse
 import json
 import re
 import platform
-import requests
 import subprocess
+import time
+import base64
+import shutil
 import contextlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from icecream import ic
 from config import OPENAI_API_KEY
 from autogen_agents import AutogenAgents
+from repo_cache import MIRROR_DIR, checkout_repo, reset_checkout
+from env_cache import ENV_BUILD_TIMEOUT, ENV_CACHE_MAX_BYTES, ENV_DIR, EnvironmentCache
+from eval_queue import DEFAULT_EVAL_CONCURRENCY, EvaluationQueue
+from executor_pool import ExecutorPool, LocalExecutorPool
+from chat_history import DEFAULT_CONTEXT_BUDGET
+from checkpoint import CHECKPOINT_FILE, Checkpoint
+from http_client import DEFAULT_RETRIES, CoordinatorClient, ServiceError, TaskServiceClient, TestServiceClient
+from model_router import DEFAULT_ENDPOINT_CONCURRENCY, ROLES, ModelRouter, parse_role_models
+from patch_store import PATCH_DIR, apply_patch, export_patch, load_patch, save_patch
+from llm_cache import LLM_CACHE_FILE, LLM_CACHE_MAX_BYTES, LLMCache
+from results_store import append_result, new_run_id, usage_from_cost
+from task_indices import parse_task_indices
+from tools.code_index import start_index
+from tracing import TRACE_DIR, init_tracing, set_track, shutdown_tracing, span
+from transcript_store import transcript_path
 
 # --- Maximale Runden für den Chat ---
 MAX_CHAT_ROUNDS = 7
 
+# --- Parallelität: wie viele Tasks gleichzeitig laufen und wie lange ein Task maximal dauern darf ---
+DEFAULT_WORKERS = 4
+TASK_TIMEOUT = 60 * 60  # Sekunden
+
 WORK_DIR = os.path.abspath('repos')
 LOG_DIR = os.path.abspath('logs')
 
 os.makedirs(WORK_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = f"{LOG_DIR}/results.log"	
-with open(LOG_FILE, "w", encoding="utf-8") as log:
-    log.write(f"--- Starting new run on {platform.node()} at {os.getcwd()} ---\n")
-    
-TASK_API_URL = "http://localhost:8081/task/index/"  # API endpoint for SWE-Bench-Lite
+# Ein strukturierter Eintrag pro Instanz, append-only (siehe results_store.py)
+RUN_ID = new_run_id()
+
+TASK_API_URL = os.environ.get("TASK_API_URL", "http://localhost:8081/task/index/")  # API endpoint for SWE-Bench-Lite
+TEST_API_URL = os.environ.get("TEST_API_URL", "http://localhost:8082/test")  # SWE-Bench REST service for evaluation
+TEST_TIMEOUT = 60 * 30  # Sekunden pro Testlauf
+# Worker-Modus (--coordinator): Wartezeit, wenn gerade alle Tasks verliehen sind
+LEASE_POLL_INTERVAL = 10  # Sekunden
+
+# Über LLM_BASE_URL lässt sich z.B. ein lokaler Ersatz-Modellserver einsetzen
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "http://188.245.32.59:4000/v1")
 
 # Konfiguration des LLM (Large Language Model)
+# Welche Rolle welches Modell nutzt, legt model_router.py fest (--models); die anderen Einträge dienen als Fallback.
+# Optional pro Eintrag: "max_concurrency" (gleichzeitige Requests an den Endpoint), "timeout", "max_retries".
 config_list = [
-    # {
-    #     "model": "gpt-4o-mini",
-    #     "api_key": OPENAI_API_KEY,
-    #     "base_url": "http://188.245.32.59:4000/v1",  # Local LLM server
-    #     "max_tokens": 8096,
-    # },
     {
         "model": "gpt-4o",
         "api_key": OPENAI_API_KEY,
-        "base_url": "http://188.245.32.59:4000/v1",  # Local LLM server
+        "base_url": LLM_BASE_URL,  # Local LLM server
+        "max_tokens": 8096,
+    },
+    {
+        "model": "gpt-4o-mini",
+        "api_key": OPENAI_API_KEY,
+        "base_url": LLM_BASE_URL,  # Local LLM server
         "max_tokens": 8096,
     },
 ]
 
+# Modell-Zuordnung pro Agent-Rolle mit Fallback und Endpoint-Limits (wird in main() gesetzt)
+model_router = None
+# Sprecherauswahl im Group-Chat: "rules" (Zustandsautomat, LLM nur als Fallback) oder "auto" (wird in main() gesetzt)
+speaker_selection = "rules"
+# Persistenter Response-Cache für alle Chats (wird in main() gesetzt, None = deaktiviert)
+llm_cache = None
+# Token-Budget für den Chatverlauf pro LLM-Call (wird in main() gesetzt, 0 = unbegrenzt)
+context_budget = DEFAULT_CONTEXT_BUDGET
+# HTTP-Clients für Task- und Test-Service (werden in main() gesetzt) und vorab geladene Tasks
+task_client = None
+test_client = None
+# Evaluations-Stufe: nimmt committete Patches entgegen, Tests laufen ohne Worker-Slot (wird in main() gesetzt)
+evaluator = None
+prefetched_tasks = {}
+# Arbeitsverzeichnisse der Agents nach dem Patch-Export behalten (wird in main() gesetzt)
+keep_workspaces = False
+# Warme Docker-Container für die Code-Ausführung (wird in main() gesetzt, None = ein Container pro Task)
+executor_pool = None
+# Vorgebaute Dependency-Environments der Ziel-Repos (wird in main() gesetzt, None = Agents installieren selbst)
+env_cache = None
+
+
+def fail_stage(record, stage, error):
+    # Nur der erste Fehler bestimmt die Fehlerklasse der Instanz
+    if not record.get("error_class"):
+        record["failed_stage"] = stage
+        record["error_class"] = type(error).__name__
+        record["error"] = str(error)
+
+
+async def run_stage(record, stage, func, *args):
+    start = time.perf_counter()
+    try:
+        with span(stage, index=record["index"], instance_id=record["instance_id"]):
+            # Async-Stufen (HTTP) laufen im Event-Loop, blockierende im Thread-Pool
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args)
+            return await asyncio.to_thread(func, *args)
+    except Exception as e:
+        fail_stage(record, stage, e)
+        raise
+    finally:
+        record["timings"][stage] = round(time.perf_counter() - start, 3)
+
+
+async def fetch_task(index):
+    # Vorab geladene Tasks (siehe main) sparen den Einzelabruf
+    if index in prefetched_tasks:
+        return prefetched_tasks.pop(index)
+    print(f"Fetching test case {index} from {TASK_API_URL}{index}...")
+    return await task_client.fetch_task(index)
+
+
+def run_agents(prompt, repo_dir, instance_id, env_key=None, stop_event=None):
+    with contextlib.ExitStack() as stack:
+        # Environment während des Chats festhalten, damit es nicht verdrängt wird
+        env_dir = stack.enter_context(env_cache.use(env_key)) if env_key else None
+        # Mit Pool: warmen Container leihen, sonst startet AutogenAgents einen eigenen
+        executor = stack.enter_context(executor_pool.lease(repo_dir, env_dir)) if executor_pool else None
+        agents = AutogenAgents(llm_config=config_list[0], current_dir=repo_dir, max_rounds=MAX_CHAT_ROUNDS,
+                               executor=executor, cache=llm_cache, context_budget=context_budget, router=model_router,
+                               speaker_selection=speaker_selection, transcript_file=transcript_path(instance_id))
+        try:
+            chat_cost = agents.assign_task(
+                task=prompt,
+                max_rounds=MAX_CHAT_ROUNDS,
+                stop_event=stop_event,
+            )
+        finally:
+            agents.close()
+    stats = {}
+    cache_stats = agents.get_cache_stats()
+    if cache_stats:
+        stats["cache_hits"], stats["cache_misses"] = cache_stats["hits"], cache_stats["misses"]
+    stats.update(agents.get_history_stats() or {})
+    stats.update(agents.get_speaker_stats() or {})
+    stats.update(agents.get_transcript_stats() or {})
+    if agents.get_stop_reason():
+        stats["stop_reason"] = agents.get_stop_reason()
+    return chat_cost, stats
 
-async def handle_task(index):
-    api_url = f"{TASK_API_URL}{index}"
-    print(f"Fetching test case {index} from {api_url}...")
+
+def setup_env(repo_url, repo_dir):
+    # Dependencies einmal pro Repo + Dependency-Dateien installieren, im Executor (passendes Python);
+    # nur der Build-Container darf in die (sonst read-only gemounteten) Environments schreiben
+    key = env_cache.ensure(repo_url, repo_dir, functools.partial(executor_pool.builder, repo_dir), executor_pool.env_tag)
+    # "pip install ." hinterlässt build/ und *.egg-info im Checkout – vor dem Chat wieder entfernen
+    reset_checkout(repo_dir)
+    return key
+
+
+def export_changes(instance_id, repo_dir, base_commit):
+    # Statt eines Commits im Arbeitsverzeichnis nur den Diff der Agents sichern – das Repo wird danach nicht mehr gebraucht
+    patch = export_patch(repo_dir, base_commit)
+    ic(f"Exported patch for {instance_id}: {len(patch)} bytes.")
+    return save_patch(instance_id, patch)
+
+
+def remove_workspace(repo_dir):
+    # Objekte liegen im Mirror, gelöscht wird nur Working Tree + Index
+    shutil.rmtree(repo_dir, ignore_errors=True)
+
+
+def prepare_evaluation(slot, job):
+    # Pro Evaluator ein wiederverwendeter Checkout: Reset auf den Basis-Commit, dann den gespeicherten Patch anwenden;
+    # wechselt das Repo, klont checkout_repo den Slot neu (Objekte bleiben im Mirror)
+    eval_dir = os.path.join(WORK_DIR, f"eval_{slot}")
+    checkout_repo(job["repo_url"], eval_dir, job["base_commit"])
+    if job.get("patch_file"):
+        apply_patch(eval_dir, load_patch(job["patch_file"]))
+    return {
+        "instance_id": job["instance_id"],
+        "repoDir": f"/repos/eval_{slot}",  # mount with docker
+        "FAIL_TO_PASS": job["fail_tests"],
+        "PASS_TO_PASS": job["pass_tests"]
+    }
+
+
+async def handle_task(index, semaphore, timeout, checkpoint, reevaluate=False, evaluate_only=False):
+    instance_id, entry = checkpoint.find_by_index(index)
+    if entry.get("stage") == "evaluated" and not reevaluate:
+        print(f"Test case {index} ({instance_id}) already evaluated – skipping.")
+        return
+    if evaluate_only and not checkpoint.reached(instance_id, "committed"):
+        print(f"Test case {index} has no stored patch – skipping evaluation.")
+        return
+
+    record = {
+        "run_id": RUN_ID,
+        "host": platform.node(),
+        "index": index,
+        "instance_id": instance_id,
+        "started_at": time.time(),
+        "timings": {},
+    }
+    if entry.get("stage"):
+        record["resumed_from"] = entry["stage"]
+    set_track(index, f"task {index}")
+    # Der Chat-Thread lässt sich nicht abbrechen – er prüft nach jeder Nachricht dieses Flag und endet dann,
+    # damit er nicht weiter LLM-Calls macht und Executor, Environment und Thread belegt
+    stop_event = threading.Event()
+    try:
+        # Nur Fetch/Repo/Chat/Patch-Export belegen einen Worker-Slot; die Evaluation wartet danach in der Queue
+        async with semaphore:
+            try:
+                job = await asyncio.wait_for(process_task(index, record, checkpoint, stop_event),
+                                             timeout=timeout or None)
+            except asyncio.TimeoutError:
+                stop_event.set()
+                print(f"Test case {index} timed out after {timeout}s")
+                fail_stage(record, "timeout", TimeoutError(f"task timed out after {timeout}s"))
+                return record
+        if not checkpoint.reached(job["instance_id"], "committed"):
+            # Chat oder Patch-Export gescheitert: nicht den unveränderten Basis-Commit testen und nicht als
+            # "evaluated" markieren – ein Neustart setzt bei der letzten erreichten Stufe wieder an
+            print(f"Test case {index} has no stored patch – skipping evaluation, a restart retries it.")
+            return record
+        await evaluate_task(index, record, checkpoint, job)
+    except asyncio.CancelledError:
+        stop_event.set()
+        fail_stage(record, "timeout", TimeoutError("task cancelled or timed out"))
+        raise
+    except Exception as e:
+        fail_stage(record, "task", e)
+        print(f"Error in test case {index}: {e}")
+    finally:
+        record["duration"] = round(time.time() - record["started_at"], 3)
+        append_result(record)
+    return record
+
+
+async def process_task(index, record, checkpoint, stop_event=None):
     repo_dir = os.path.join(WORK_DIR, f"repo_{index}")  # Use unique repo directory per task
-    start_dir = os.getcwd()  # Remember original working directory
 
-    response = requests.get(api_url)
-    if response.status_code != 200:
-        raise Exception(f"Invalid response: {response.status_code}")
+    # Bereits erreichte Stufen aus dem Checkpoint werden übersprungen – insbesondere kein zweiter LLM-Chat
+    instance_id, entry = checkpoint.find_by_index(index)
+    testcase = await asyncio.to_thread(checkpoint.load_testcase, instance_id)
 
-    testcase = response.json()
+    # HTTP-Aufrufe laufen async im Event-Loop, blockierende Schritte (git, Chat, Checkpoint mit fsync) im Thread-Pool
+    if testcase is None:
+        testcase = await run_stage(record, "fetch", fetch_task, index)
+        await asyncio.to_thread(checkpoint.save_testcase, testcase["instance_id"], testcase)
+        await asyncio.to_thread(checkpoint.update, testcase["instance_id"], "fetched", index=index)
     prompt = testcase["Problem_statement"]
     git_clone = testcase["git_clone"]
     fail_tests = json.loads(testcase.get("FAIL_TO_PASS", "[]"))
     pass_tests = json.loads(testcase.get("PASS_TO_PASS", "[]"))
     instance_id = testcase["instance_id"]
-    
+    record["instance_id"] = instance_id
+
     print(f"Received prompt for test case {index}: {len(prompt)} characters")
     print(f"Git: {git_clone}")
     print("______________________________")
     print("Starting test case processing...")
     print("______________________________")
-    
+
     # Extract repo URL and commit hash
     parts = git_clone.split("&&")
     clone_part = parts[0].strip()
     checkout_part = parts[-1].strip() if len(parts) > 1 else None
 
     repo_url = clone_part.split()[2]
-    
-    try:
-        ic("Setting up our repo dependencies if any...")
-        # Extrahiere Commit-Hash
-        commit_hash = checkout_part.split()[-1] if checkout_part else "main"
+    # Extrahiere Commit-Hash
+    commit_hash = checkout_part.split()[-1] if checkout_part else "main"
 
-        # Repository aufbauen
-        setup_repo(repo_url, repo_dir, commit_hash)
-    except Exception as e:
-        print(f"Error setting up repository for test case {index}: {e}")
-        
-    try:
-        ic("Starting the code generation process...")
-        current_dir = os.path.join(WORK_DIR, f"repo_{index}")
-
-        ic("Starting chat with agents...")
-        agents = AutogenAgents(llm_config=config_list[0], current_dir=current_dir, max_rounds=MAX_CHAT_ROUNDS)
-        chat_cost = agents.assign_task(
-            task=prompt,
-            max_rounds=MAX_CHAT_ROUNDS,
-        )
-        ic(chat_cost)
-        ic("Chat completed.")
-        
-        # git commit manuell durchführen, da die Agents auch bei direkter Anordung nie eigenständig korrekt commiten konnten.
+    if checkpoint.reached(instance_id, "chat_done"):
+        # Änderungen der Agents liegen schon im Repo – kein Reset, kein neuer Chat
+        ic(f"Resuming {instance_id} after chat.")
+        entry = checkpoint.get(instance_id)
+        record.update(entry.get("usage", {}))
+    else:
+        try:
+            ic("Setting up our repo dependencies if any...")
+            # Repository aufbauen (auch bei Stufe "repo_ready" erneut, um halbe Chat-Änderungen zu verwerfen)
+            base_commit = await run_stage(record, "setup_repo", setup_repo, repo_url, repo_dir, commit_hash)
+            await asyncio.to_thread(checkpoint.update, instance_id, "repo_ready", base_commit=base_commit)
+        except Exception as e:
+            print(f"Error setting up repository for test case {index}: {e}")
+
+        env_key = None
+        if env_cache:
+            try:
+                env_key = await run_stage(record, "setup_env", setup_env, repo_url, repo_dir)
+                record["env_key"] = env_key
+            except Exception as e:
+                # Ohne Environment kann der Chat trotzdem laufen, die Agents installieren dann selbst
+                print(f"Error setting up the environment for test case {index}: {e}")
+
+        try:
+            ic("Starting chat with agents...")
+            chat_cost, chat_stats = await run_stage(record, "chat", run_agents, prompt, repo_dir, instance_id, env_key,
+                                                   stop_event)
+            ic(chat_cost, chat_stats)
+            ic("Chat completed.")
+            usage = usage_from_cost(chat_cost)
+            usage.update(chat_stats)
+            record.update(usage)
+            await asyncio.to_thread(checkpoint.update, instance_id, "chat_done", usage=usage)
+        except Exception as e:
+            print(f"Error during chat processing for test case {index}: {e}")
+
+    base_commit = checkpoint.get(instance_id).get("base_commit") or commit_hash
+    # Stufe "committed": der Patch der Agents ist unter logs/patches gespeichert
+    # (ältere Checkpoints ohne patch_file haben nur den Commit im Repo – daraus wird der Patch nachträglich erzeugt)
+    entry = checkpoint.get(instance_id)
+    if checkpoint.reached(instance_id, "committed") and entry.get("patch_file"):
+        record.update({k: entry[k] for k in ("patch_size", "patch_sha256", "patch_files") if k in entry})
+    elif checkpoint.reached(instance_id, "chat_done"):
         try:
-            env = os.environ.copy()
-            subprocess.run(["git", "add", "."], cwd=repo_dir, check=True, env=env)
-            ic("Git add completed.")
-            subprocess.run(["git", "commit", "-m", "Solved Task by Autogen"], cwd=repo_dir, check=True, env=env)
-            ic("Git commit completed.")
+            patch_info = await run_stage(record, "export_patch", export_changes, instance_id, repo_dir, base_commit)
+            record.update(patch_info)
+            await asyncio.to_thread(checkpoint.update, instance_id, "committed", **patch_info)
+            if not keep_workspaces:
+                await asyncio.to_thread(remove_workspace, repo_dir)
         except subprocess.CalledProcessError as e:
-            print(f"Git commit failed: {e}")
+            print(f"Patch export failed: {e.stderr.decode(errors='replace') if e.stderr else e}")
 
-    except Exception as e:
-        print(f"Error during chat processing for test case {index}: {e}")
+    return {
+        "instance_id": instance_id,
+        "repo_url": repo_url,
+        "base_commit": base_commit,
+        "patch_file": checkpoint.get(instance_id).get("patch_file"),
+        "fail_tests": fail_tests,
+        "pass_tests": pass_tests,
+    }
 
 
+async def evaluate_task(index, record, checkpoint, job):
+    # Call REST service instead for evaluation changes from agent
     ic("Evaluating test results...")
+    instance_id = job["instance_id"]
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as log:            
-                log.write(f"\n--- TESTCASE {index} ---\n")
-        
+        record["fail_to_pass"], record["pass_to_pass"], record["timings"]["eval_queue"] = await run_stage(
+            record, "evaluate", evaluator.evaluate, instance_id, job)
+        await asyncio.to_thread(checkpoint.update, instance_id, "evaluated", fail_to_pass=record["fail_to_pass"],
+                                pass_to_pass=record["pass_to_pass"])
+    except Exception as e:
+        fail_stage(record, "evaluate", e)
+        print(f"Error calling SWE-Bench Test service for test case {index}: {e}")
+        return
+    print(f"Test case {index} completed and logged.")
+
+
+async def keep_lease(coordinator, index, lease_id, lease_ttl):
+    # Heartbeat deutlich vor Ablauf; ein verlorener Lease bricht den Task nicht ab (erstes Ergebnis zählt)
+    while True:
+        await asyncio.sleep(lease_ttl / 3)
         try:
-            usage = chat_cost.get('usage_including_cached_inference')
-            ic(usage)
-            # Modellnamen filtern (alles außer 'total_cost')
-            model_data = {k: v for k, v in usage.items() if k != 'total_cost'}
-
-            # Falls du nur den ersten (oder einzigen) Eintrag brauchst:
-            model_name, data = next(iter(model_data.items()))
-
-            total_tokens = data['total_tokens']
-            total_cost = usage['total_cost']
-            with open(LOG_FILE, "a", encoding="utf-8") as log:   
-                log.write(f"Model: {model_name}\n")
-                log.write(f"Total Tokens Used: {total_tokens}\n")
-                log.write(f"Total Cost: {total_cost:.4f}\n")
-        except Exception as e:
-            with open(LOG_FILE, "a", encoding="utf-8") as log:   
-                log.write(f"No Token Info: {e}\n") 
+            if not await coordinator.heartbeat(index, lease_id):
+                print(f"Lease of test case {index} expired – the coordinator may hand it to another worker.")
+        except ServiceError as e:
+            print(f"Heartbeat for test case {index} failed: {e}")
+
+
+def lease_result(index, record, checkpoint):
+    # Ergebnis, Checkpoint-Eintrag und gespeicherter Patch gehen an den Coordinator
+    instance_id, entry = checkpoint.find_by_index(index)
+    result = {"instance_id": instance_id, "record": record, "checkpoint": entry,
+              "testcase": checkpoint.load_testcase(instance_id)}
+    if entry.get("patch_file"):
+        with open(os.path.join(PATCH_DIR, entry["patch_file"]), "rb") as f:
+            result["patch"] = base64.b64encode(f.read()).decode("ascii")
+    return result
+
 
-        # Call REST service instead for evaluation changes from agent
-        ic(f"Calling SWE-Bench REST service with repo", repo_dir)
+async def work_slot(coordinator, semaphore, timeout, checkpoint, reevaluate):
+    # Ein Slot bearbeitet nacheinander geleaste Tasks, bis der Coordinator nichts mehr offen hat
+    while True:
+        lease = await coordinator.lease()
+        if lease.get("index") is None:
+            if lease.get("done"):
+                return
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            continue
+        index, lease_id = lease["index"], lease["lease_id"]
+        heartbeat = asyncio.create_task(keep_lease(coordinator, index, lease_id, lease["lease_ttl"]))
         try:
-            test_payload = { 
-                "instance_id": instance_id,
-                "repoDir": f"/repos/repo_{index}",  # mount with docker
-                "FAIL_TO_PASS": fail_tests,
-                "PASS_TO_PASS": pass_tests
-            }
-            res = requests.post("http://localhost:8082/test", json=test_payload) 
-            ic(res)
-            ic(res.status_code)  
-            ic(res.text)
-            res.raise_for_status()
-            result_raw = res.json().get("harnessOutput", "{}")
-            result_json = json.loads(result_raw)
-            if not result_json:
-                raise ValueError("No data in harnessOutput – possible evaluation error or empty result")
-            instance_id = next(iter(result_json))
-            tests_status = result_json[instance_id]["tests_status"]
-            fail_pass_results = tests_status["FAIL_TO_PASS"]
-            fail_pass_total = len(fail_pass_results["success"]) + len(fail_pass_results["failure"])
-            fail_pass_passed = len(fail_pass_results["success"])
-            pass_pass_results = tests_status["PASS_TO_PASS"]
-            pass_pass_total = len(pass_pass_results["success"]) + len(pass_pass_results["failure"])
-            pass_pass_passed = len(pass_pass_results["success"])
-  
-            # Log results
-            os.chdir(start_dir)
-            with open(LOG_FILE, "a", encoding="utf-8") as log: 
-                log.write(f"FAIL_TO_PASS passed: {fail_pass_passed}/{fail_pass_total}\n") 
-                log.write(f"PASS_TO_PASS passed: {pass_pass_passed}/{pass_pass_total}\n")
-        except Exception as e: 
-            os.chdir(start_dir)  
-            with open(LOG_FILE, "a", encoding="utf-8") as log:
-                log.write(f"Error calling SWE-Bench Test service: {e}\n")
-            print(f"Error calling SWE-Bench Test service for test case {index}: {e}")
-            return
-        print(f"Test case {index} completed and logged.")
-    except Exception as e:
-        os.chdir(start_dir)
-        with open(LOG_FILE, "a", encoding="utf-8") as log: 
-            log.write(f"Error: {e}\n")
-        print(f"Error in test case {index}: {e}") 
+            record = await handle_task(index, semaphore, timeout, checkpoint, reevaluate)
+        except asyncio.CancelledError:
+            # Worker wird beendet: Task sofort zurückgeben statt auf den Lease-Ablauf zu warten
+            with contextlib.suppress(ServiceError):
+                await asyncio.shield(coordinator.release(index, lease_id))
+            raise
+        finally:
+            heartbeat.cancel()
+        result = await asyncio.to_thread(lease_result, index, record, checkpoint)
+        if not await coordinator.complete(index, lease_id, result):
+            print(f"Test case {index} was already completed by another worker.")
+
+
+async def run_worker(coordinator, workers, semaphore, timeout, checkpoint, reevaluate):
+    # Zusätzliche Slots für Tasks in der Evaluation, damit die Worker-Slots weiter Chats bearbeiten
+    slots = workers + evaluator.concurrency
+    print(f"Working for coordinator {coordinator.base_url} as {coordinator.worker} with {slots} slot(s)...")
+    await asyncio.gather(*(work_slot(coordinator, semaphore, timeout, checkpoint, reevaluate) for _ in range(slots)))
 
 
 def setup_repo(repo_url: str, repo_dir: str, commit_hash: str):
     ic("Setting up repository...")
 
-    env = os.environ.copy()
-    env["GIT_TERMINAL_PROMPT"] = "0"
+    # Klont nur einmal pro Upstream in den Mirror-Cache, danach leichter Checkout + Reset/Clean
+    commit = checkout_repo(repo_url, repo_dir, commit_hash)
+    ic(f"Repository checked out at {commit}.")
+    # Code-Index des Commits im Hintergrund bauen bzw. aus dem Cache laden, bevor der Planner ihn braucht
+    start_index(repo_dir, commit)
+    return commit
 
-    if not os.path.exists(repo_dir): 
-        subprocess.run(["git", "clone", repo_url, repo_dir], check=True, env=env)
-    else:
-        ic(f"Repo {repo_dir} already exists – skipping clone.")
-  
-    subprocess.run(["git", "checkout", commit_hash], cwd=repo_dir, check=True, env=env)
-    ic("Repository checked out.")
 
- 
-    
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Autogen agents on SWE-Bench-Lite tasks.")
+    parser.add_argument("--tasks", default="1", help="Task indices, e.g. '1-10,15,20-30:5' (default: 1)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of tasks processed concurrently")
+    parser.add_argument("--timeout", type=float, default=TASK_TIMEOUT, help="Timeout per task in seconds (0 = no timeout)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint file used to resume interrupted runs")
+    parser.add_argument("--fresh", action="store_true", help="Ignore checkpointed progress of the selected tasks")
+    parser.add_argument("--llm-cache", default=LLM_CACHE_FILE, help="SQLite file of the LLM response cache")
+    parser.add_argument("--llm-cache-max-mb", type=int, default=LLM_CACHE_MAX_BYTES // 1024 ** 2,
+                        help="Evict least recently used responses above this size")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Disable the LLM response cache")
+    parser.add_argument("--replay", action="store_true",
+                        help="Only answer from the LLM response cache; a cache miss fails the chat")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET,
+                        help="Token budget of the chat history sent per LLM call (0 = unlimited)")
+    parser.add_argument("--models", default="",
+                        help="Model per agent role, e.g. 'coder=gpt-4o,speaker_selection=gpt-4o-mini' "
+                             f"(roles: {', '.join(ROLES)})")
+    parser.add_argument("--speaker-selection", choices=["rules", "auto"], default="rules",
+                        help="Pick the next speaker by rules (LLM only as fallback) or by an LLM call every round")
+    parser.add_argument("--endpoint-concurrency", type=int, default=DEFAULT_ENDPOINT_CONCURRENCY,
+                        help="Concurrent LLM requests per endpoint across all tasks")
+    parser.add_argument("--executors", type=int, default=None,
+                        help="Warm Docker executor containers shared by all tasks (default: --workers, 0 = one per task)")
+    parser.add_argument("--local-executor", action="store_true",
+                        help="Run agent code on the host instead of in Docker (trusted code only, e.g. benchmarks)")
+    parser.add_argument("--no-env-cache", action="store_true",
+                        help="Do not prebuild the target repositories' dependency environments")
+    parser.add_argument("--env-cache-max-gb", type=float, default=ENV_CACHE_MAX_BYTES / 1024 ** 3,
+                        help="Evict least recently used environments above this disk size")
+    parser.add_argument("--env-build-timeout", type=float, default=ENV_BUILD_TIMEOUT,
+                        help="Timeout of one environment build in seconds")
+    parser.add_argument("--task-api", default=TASK_API_URL, help="Base URL of the task service")
+    parser.add_argument("--test-api", default=TEST_API_URL, help="URL of the test service")
+    parser.add_argument("--http-retries", type=int, default=DEFAULT_RETRIES, help="Retries for failed service calls")
+    parser.add_argument("--test-timeout", type=float, default=TEST_TIMEOUT, help="Timeout of one test service call in seconds")
+    parser.add_argument("--test-concurrency", type=int, default=DEFAULT_EVAL_CONCURRENCY,
+                        help="Test service calls running at the same time")
+    parser.add_argument("--no-prefetch", action="store_true", help="Do not fetch all task definitions up front")
+    parser.add_argument("--trace", help="Chrome trace file for stage/agent spans (default: logs/traces/<run id>.json)")
+    parser.add_argument("--no-trace", action="store_true", help="Disable span tracing")
+    parser.add_argument("--reevaluate", action="store_true",
+                        help="Evaluate already evaluated tasks again (reuses the stored patch, no new chat)")
+    parser.add_argument("--evaluate-only", action="store_true",
+                        help="Only (re-)evaluate tasks with a stored patch; no fetch, chat or patch export")
+    parser.add_argument("--keep-workspaces", action="store_true",
+                        help="Keep the agents' checkout (repos/repo_<index>) after the patch was exported")
+    parser.add_argument("--coordinator",
+                        help="Run as worker node: lease tasks from this coordinator URL instead of --tasks")
+    parser.add_argument("--worker-name", default=f"{platform.node()}-{os.getpid()}",
+                        help="Name of this worker node at the coordinator")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    global llm_cache, model_router, speaker_selection, executor_pool, env_cache, context_budget, task_client, test_client, evaluator, keep_workspaces
+    args = parse_args(argv)
+    indices = parse_task_indices(args.tasks)
+    workers = max(1, args.workers)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.fresh:
+        for index in indices:
+            instance_id, _ = checkpoint.find_by_index(index)
+            if instance_id:
+                checkpoint.reset(instance_id)
+
+    if args.replay and args.no_llm_cache:
+        raise SystemExit("--replay requires the LLM response cache")
+    if not args.no_llm_cache:
+        llm_cache = LLMCache(args.llm_cache, max_bytes=args.llm_cache_max_mb * 1024 ** 2, replay=args.replay)
+
+    try:
+        model_router = ModelRouter(config_list, parse_role_models(args.models), args.endpoint_concurrency)
+    except ValueError as e:
+        raise SystemExit(f"--models: {e}")
+
+    # Jeder laufende Task blockiert maximal einen Thread gleichzeitig (Chat, git oder HTTP).
+    # Reserve für Chat-Threads, die nach einem Timeout noch zu Ende laufen.
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers * 2, thread_name_prefix="task"))
+
+    if not args.no_trace:
+        trace_path = args.trace or os.path.join(TRACE_DIR, f"{RUN_ID}.json")
+        init_tracing(trace_path)
+        print(f"Writing trace to {trace_path}")
+
+    context_budget = args.context_budget
+    speaker_selection = args.speaker_selection
+    keep_workspaces = args.keep_workspaces
+    executors = workers if args.executors is None else args.executors
+    if args.local_executor:
+        executor_pool = LocalExecutorPool(WORK_DIR)
+    elif executors > 0 and not args.evaluate_only:
+        # Mirrors und Environments teilen sich alle Tasks – in den Containern nur lesbar
+        executor_pool = ExecutorPool(executors, WORK_DIR, read_only_dirs=[MIRROR_DIR, ENV_DIR])
+    if executor_pool and not args.no_env_cache and not args.evaluate_only:
+        env_cache = EnvironmentCache(max_bytes=int(args.env_cache_max_gb * 1024 ** 3), build_timeout=args.env_build_timeout)
+
+    # Eine gemeinsame Session (Keep-Alive-Pool) für beide Services, Limits pro Endpoint
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64, keepalive_timeout=60))
+    task_client = TaskServiceClient(args.task_api, retries=args.http_retries, max_concurrency=8, session=session)
+    test_client = TestServiceClient(args.test_api, timeout=args.test_timeout, retries=args.http_retries,
+                                    max_concurrency=args.test_concurrency, session=session)
+    evaluator = EvaluationQueue(test_client, concurrency=args.test_concurrency, prepare=prepare_evaluation)
+    reevaluate = args.reevaluate or args.evaluate_only
+
+    coordinator = None
+    if args.coordinator:
+        coordinator = CoordinatorClient(args.coordinator, args.worker_name, retries=args.http_retries, session=session)
+    else:
+        print(f"Running {len(indices)} task(s) with {workers} worker(s), run id {RUN_ID}...")
+    semaphore = asyncio.Semaphore(workers)
+    try:
+        if not args.no_prefetch and not args.evaluate_only and not coordinator:
+            missing = [i for i in indices if checkpoint.load_testcase(checkpoint.find_by_index(i)[0]) is None]
+            prefetched_tasks.update(await task_client.prefetch(missing))
+        if executor_pool:
+            await asyncio.to_thread(executor_pool.warm_up)
+        evaluator.start()
+        if coordinator:
+            await run_worker(coordinator, workers, semaphore, args.timeout, checkpoint, reevaluate)
+        else:
+            await asyncio.gather(*(handle_task(i, semaphore, args.timeout, checkpoint, reevaluate, args.evaluate_only)
+                                   for i in indices))
+    finally:
+        await evaluator.close()
+        await session.close()
+        model_router.close()
+        if executor_pool:
+            executor_pool.shutdown()
+        shutdown_tracing()
 
-async def main():  
-    for i in range(1, 2, 5):
-        await handle_task(i)
 
-  
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
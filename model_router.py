@@ -0,0 +1,144 @@
+import threading
+
+import httpx
+
+# Rollen, für die ein eigenes Modell gewählt werden kann
+ROLES = ("planner", "coder", "user", "speaker_selection")
+
+# Bevorzugtes Modell pro Rolle; die übrigen Einträge der config_list sind Fallbacks in ihrer Reihenfolge.
+# Sprecherauswahl und User-Proxy brauchen kein teures Modell.
+DEFAULT_ROLE_MODELS = {
+    "planner": "gpt-4o",
+    "coder": "gpt-4o",
+    "user": "gpt-4o-mini",
+    "speaker_selection": "gpt-4o-mini",
+}
+
+# Gleichzeitige Requests pro Endpoint (base_url) über alle Chats; pro Eintrag mit "max_concurrency" überschreibbar
+DEFAULT_ENDPOINT_CONCURRENCY = 8
+# Ohne Antwort nach so vielen Sekunden wird auf die nächste Konfiguration ausgewichen
+DEFAULT_REQUEST_TIMEOUT = 300
+# Retries des OpenAI-Clients pro Konfiguration (429/5xx), danach übernimmt der Fallback
+DEFAULT_MAX_RETRIES = 1
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    # Gibt den Endpoint-Slot erst frei, wenn die Antwort vollständig gelesen bzw. geschlossen ist
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    def __init__(self, semaphore: threading.BoundedSemaphore):
+        self._semaphore = semaphore
+        self._transport = httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        self._semaphore.acquire()
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self._semaphore.release()
+
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_ReleasingStream(response.stream, release), extensions=response.extensions)
+
+    def close(self):
+        self._transport.close()
+
+
+class EndpointClient(httpx.Client):
+    """``httpx.Client`` shared by every agent that talks to one endpoint.
+
+    autogen deep-copies each ``llm_config``; returning ``self`` keeps the connection pool and
+    the concurrency limit shared instead of copying them per agent.
+    """
+
+    def __init__(self, max_concurrency: int, timeout: float):
+        super().__init__(transport=_LimitedTransport(threading.BoundedSemaphore(max_concurrency)), timeout=timeout)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ModelRouter:
+    """Builds one ``llm_config`` per agent role from a shared ``config_list``.
+
+    The preferred model of a role comes first, all other entries follow as fallbacks –
+    autogen's ``OpenAIWrapper`` moves on to the next entry when a request fails with a
+    rate limit, server error or timeout. All entries with the same ``base_url`` share one
+    HTTP client, which caps concurrent requests to that endpoint across all running chats.
+    """
+
+    def __init__(self, config_list, role_models: dict = None,
+                 endpoint_concurrency: int = DEFAULT_ENDPOINT_CONCURRENCY):
+        if not config_list:
+            raise ValueError("config_list is empty")
+        self.role_models = {**DEFAULT_ROLE_MODELS, **(role_models or {})}
+        unknown = set(self.role_models) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown role(s) {', '.join(sorted(unknown))}; expected one of {', '.join(ROLES)}")
+
+        self._clients = {}
+        self.config_list = []
+        for entry in config_list:
+            entry = dict(entry)
+            limit = entry.pop("max_concurrency", endpoint_concurrency)
+            entry.setdefault("max_retries", DEFAULT_MAX_RETRIES)
+            base_url = entry.get("base_url", "")
+            if base_url not in self._clients:
+                self._clients[base_url] = EndpointClient(limit, entry.get("timeout", DEFAULT_REQUEST_TIMEOUT))
+            entry["http_client"] = self._clients[base_url]
+            entry.setdefault("timeout", DEFAULT_REQUEST_TIMEOUT)
+            self.config_list.append(entry)
+
+        models = {entry["model"] for entry in self.config_list}
+        # Rollen mit einem Modell, das nicht in der config_list steht, bekommen das erste Modell
+        for role, model in list(self.role_models.items()):
+            if model not in models:
+                print(f"Model {model} for role {role} is not configured – using {self.config_list[0]['model']}.")
+                self.role_models[role] = self.config_list[0]["model"]
+
+    def model(self, role: str) -> str:
+        return self.role_models[role]
+
+    def llm_config(self, role: str) -> dict:
+        preferred = self.model(role)
+        ordered = [e for e in self.config_list if e["model"] == preferred]
+        ordered += [e for e in self.config_list if e["model"] != preferred]
+        return {"config_list": ordered}
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+
+
+def parse_role_models(spec: str) -> dict:
+    """Parse ``"planner=gpt-4o,speaker_selection=gpt-4o-mini"`` into a role -> model dict."""
+    role_models = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        role, sep, model = part.partition("=")
+        if not sep or not model.strip():
+            raise ValueError(f"Invalid model assignment '{part}', expected <role>=<model>")
+        role_models[role.strip()] = model.strip()
+    return role_models
@@ -0,0 +1,83 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import subprocess
+from icecream import ic
+
+PATCH_DIR = os.path.abspath(os.path.join('logs', 'patches'))
+
+# Dateien, die Agents nebenbei erzeugen und die nicht in den Patch gehören (git-Pathspec-Globs)
+EXCLUDE_PATTERNS = [
+    "**/__pycache__/**",
+    "**/*.py[cod]",
+    "**/.pytest_cache/**",
+    "**/.mypy_cache/**",
+    "**/.tox/**",
+    "**/*.egg-info/**",
+    "**/.coverage",
+    "**/*.orig",
+    "**/*.rej",
+    "**/*.bak",
+    "**/*~",
+    "**/.patch-*",
+    "**/tmp_code_*",  # Code-Blöcke, die autogens Executor ins Arbeitsverzeichnis schreibt
+    "build/**",  # setuptools-Build im Checkout
+]
+
+
+def _git(args, cwd, input=None):
+    env = os.environ.copy()
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    return subprocess.run(["git"] + args, cwd=cwd, check=True, env=env, input=input,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+
+
+def export_patch(repo_dir: str, base_commit: str = "HEAD") -> bytes:
+    """Return the agents' changes in ``repo_dir`` against ``base_commit`` as a binary git diff.
+
+    New files are included, stray artefacts matching ``EXCLUDE_PATTERNS`` are not. Commits the
+    agents made themselves are covered as well, since the diff is taken against the base commit.
+    """
+    pathspec = ["--", "."] + [f":(exclude,glob){pattern}" for pattern in EXCLUDE_PATTERNS]
+    _git(["add", "--all"] + pathspec, cwd=repo_dir)
+    return _git(["diff", "--cached", "--binary", "--full-index", base_commit] + pathspec, cwd=repo_dir)
+
+
+def patch_path(instance_id: str, patch_dir: str = PATCH_DIR) -> str:
+    return os.path.join(patch_dir, f"{instance_id}.patch.gz")
+
+
+def save_patch(instance_id: str, patch: bytes, patch_dir: str = PATCH_DIR) -> dict:
+    """Store ``patch`` gzip-compressed (atomic replace) and return its metadata for checkpoint and results."""
+    path = patch_path(instance_id, patch_dir)
+    os.makedirs(patch_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=patch_dir, prefix=".patch-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # mtime=0: gleicher Patch ergibt byte-gleiche Datei
+            with gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gz:
+                gz.write(patch)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return {
+        "patch_file": os.path.relpath(path, patch_dir),
+        "patch_size": len(patch),
+        "patch_sha256": hashlib.sha256(patch).hexdigest(),
+        "patch_files": patch.count(b"\ndiff --git ") + patch.startswith(b"diff --git "),
+    }
+
+
+def load_patch(patch_file: str, patch_dir: str = PATCH_DIR) -> bytes:
+    with gzip.open(os.path.join(patch_dir, patch_file), "rb") as f:
+        return f.read()
+
+
+def apply_patch(repo_dir: str, patch: bytes):
+    """Apply a patch created by :func:`export_patch` to a clean checkout."""
+    if not patch.strip():
+        ic(f"Empty patch – evaluating {repo_dir} unchanged.")
+        return
+    _git(["apply", "--binary", "--whitespace=nowarn", "-"], cwd=repo_dir, input=patch)
@@ -0,0 +1,125 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import subprocess
+from icecream import ic
+
+from tracing import span
+
+# Lokaler Mirror-Cache: jedes Upstream-Repo wird nur einmal geklont und für alle Tasks wiederverwendet.
+# Liegt unter repos/, damit relative Pfade auch im Docker-Mount (/repos) gültig bleiben.
+MIRROR_DIR = os.path.abspath(os.path.join('repos', '.mirrors'))
+
+_mirror_locks = {}
+_mirror_locks_guard = threading.Lock()
+
+
+def _git_env():
+    env = os.environ.copy()
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    return env
+
+
+def _git(args, cwd=None, check=True):
+    return subprocess.run(
+        ["git"] + args,
+        cwd=cwd,
+        check=check,
+        env=_git_env(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def _mirror_lock(repo_url):
+    with _mirror_locks_guard:
+        return _mirror_locks.setdefault(repo_url, threading.Lock())
+
+
+def mirror_path(repo_url: str, mirror_dir: str = MIRROR_DIR) -> str:
+    # Lesbarer Name + Hash, damit gleichnamige Repos verschiedener Owner nicht kollidieren
+    name = re.sub(r"\.git$", "", repo_url.rstrip("/").split("/")[-1])
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "repo"
+    digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(mirror_dir, f"{name}-{digest}.git")
+
+
+def _has_commit(git_dir: str, commit_hash: str) -> bool:
+    return _git(["rev-parse", "--verify", "--quiet", f"{commit_hash}^{{commit}}"], cwd=git_dir, check=False).returncode == 0
+
+
+def ensure_mirror(repo_url: str, commit_hash: str = None, mirror_dir: str = MIRROR_DIR) -> str:
+    """Return the path of the bare mirror for ``repo_url``, cloning or fetching it if needed."""
+    path = mirror_path(repo_url, mirror_dir)
+    with _mirror_lock(repo_url):
+        if not os.path.exists(path):
+            ic(f"Creating mirror for {repo_url}...")
+            os.makedirs(mirror_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            with span("git_clone_mirror", "git", repo_url=repo_url):
+                _git(["clone", "--mirror", repo_url, tmp_path])
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Ein anderer Prozess war schneller
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        elif commit_hash and not _has_commit(path, commit_hash):
+            ic(f"Commit {commit_hash} missing in mirror – fetching {repo_url}...")
+            with span("git_fetch_mirror", "git", repo_url=repo_url):
+                _git(["fetch", "--prune", "origin"], cwd=path)
+    return path
+
+
+def _link_to_mirror(repo_dir: str, mirror: str):
+    # Alternates relativ setzen, damit das Repo auch unter einem anderen Mount-Pfad (Docker) funktioniert
+    objects_dir = os.path.join(repo_dir, ".git", "objects")
+    rel = os.path.relpath(os.path.join(mirror, "objects"), objects_dir)
+    with open(os.path.join(objects_dir, "info", "alternates"), "w", encoding="utf-8") as f:
+        f.write(rel.replace(os.sep, "/") + "\n")
+
+
+def _origin_url(repo_dir: str):
+    result = _git(["remote", "get-url", "origin"], cwd=repo_dir, check=False)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def reset_checkout(repo_dir: str):
+    """Discard all local changes and untracked files from a previous run."""
+    _git(["reset", "--hard", "--quiet"], cwd=repo_dir)
+    _git(["clean", "-fdxq"], cwd=repo_dir)
+
+
+def checkout_repo(repo_url: str, repo_dir: str, commit_hash: str, mirror_dir: str = MIRROR_DIR):
+    """Prepare a clean checkout of ``repo_url`` at ``commit_hash`` in ``repo_dir``.
+
+    The checkout is a ``--shared`` clone of the local mirror, so it only stores its own
+    working tree and index; all objects come from the mirror.
+    """
+    mirror = ensure_mirror(repo_url, commit_hash, mirror_dir)
+    commit = _git(["rev-parse", "--verify", f"{commit_hash}^{{commit}}"], cwd=mirror).stdout.strip()
+
+    # Ein Checkout eines anderen Upstreams (z. B. wiederverwendeter Evaluations-Slot) neu klonen, statt dessen
+    # Objekte per fetch in den Checkout zu kopieren
+    if os.path.isdir(os.path.join(repo_dir, ".git")) and _origin_url(repo_dir) != repo_url:
+        ic(f"Repo {repo_dir} belongs to another upstream – cloning it again.")
+        shutil.rmtree(repo_dir, ignore_errors=True)
+
+    if os.path.isdir(os.path.join(repo_dir, ".git")):
+        ic(f"Repo {repo_dir} already exists – resetting.")
+        reset_checkout(repo_dir)
+        if not _has_commit(repo_dir, commit):
+            _git(["fetch", "--quiet", mirror, commit], cwd=repo_dir)
+    else:
+        shutil.rmtree(repo_dir, ignore_errors=True)
+        _git(["clone", "--shared", "--no-checkout", "--quiet", mirror, repo_dir])
+        _link_to_mirror(repo_dir, mirror)
+        _git(["remote", "set-url", "origin", repo_url], cwd=repo_dir)
+
+    with span("git_checkout", "git", commit=commit):
+        _git(["checkout", "--force", "--detach", "--quiet", commit], cwd=repo_dir)
+        _git(["clean", "-fdxq"], cwd=repo_dir)
+    return commit
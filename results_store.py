@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+from collections import Counter, defaultdict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RESULTS_FILE = os.path.abspath(os.path.join('logs', 'results.jsonl'))
+
+_write_lock = threading.Lock()
+
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{platform.node()}-{os.getpid()}"
+
+
+def append_result(record: dict, path: str = RESULTS_FILE):
+    """Append one record as a single JSON line.
+
+    The line is written with one ``os.write`` on an ``O_APPEND`` descriptor (plus ``flock``
+    where available), so concurrent writers – threads or processes – never interleave.
+    """
+    line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _write_lock:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def load_results(path: str = RESULTS_FILE, run_id: str = None):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Abgebrochener Schreibvorgang – Zeile überspringen
+                continue
+            if run_id and record.get("run_id") != run_id:
+                continue
+            records.append(record)
+    return records
+
+
+def usage_from_cost(chat_cost) -> dict:
+    """Sum token counts and cost over all models in an autogen ``chat.cost`` dict."""
+    usage = (chat_cost or {}).get("usage_including_cached_inference") or {}
+    billed = (chat_cost or {}).get("usage_excluding_cached_inference") or {}
+    summary = {"models": [], "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+               "cost": usage.get("total_cost", 0.0), "billed_cost": billed.get("total_cost", 0.0)}
+    for model, data in usage.items():
+        if model == "total_cost":
+            continue
+        summary["models"].append(model)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            summary[key] += data.get(key, 0)
+    return summary
+
+
+def is_resolved(record: dict) -> bool:
+    f2p, p2p = record.get("fail_to_pass"), record.get("pass_to_pass")
+    if not f2p or not p2p:
+        return False
+    return f2p["total"] > 0 and f2p["passed"] == f2p["total"] and p2p["passed"] == p2p["total"]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(records) -> dict:
+    # Bei mehrfach gelaufenen Instanzen zählt der letzte Eintrag
+    latest = {}
+    for record in records:
+        latest[record.get("instance_id") or f"index-{record.get('index')}"] = record
+    records = list(latest.values())
+
+    timings = defaultdict(list)
+    for record in records:
+        for stage, seconds in (record.get("timings") or {}).items():
+            timings[stage].append(seconds)
+
+    evaluated = [r for r in records if r.get("fail_to_pass")]
+    resolved = sum(1 for r in records if is_resolved(r))
+    return {
+        "instances": len(records),
+        "evaluated": len(evaluated),
+        "resolved": resolved,
+        "resolve_rate": resolved / len(records) if records else 0.0,
+        "fail_to_pass_tests": [sum(r["fail_to_pass"]["passed"] for r in evaluated),
+                               sum(r["fail_to_pass"]["total"] for r in evaluated)],
+        "pass_to_pass_tests": [sum(r["pass_to_pass"]["passed"] for r in evaluated),
+                               sum(r["pass_to_pass"]["total"] for r in evaluated)],
+        "total_tokens": sum(r.get("total_tokens") or 0 for r in records),
+        "total_cost": sum(r.get("cost") or 0.0 for r in records),
+        "billed_cost": sum(r.get("billed_cost") or 0.0 for r in records),
+        "cache_hits": sum(r.get("cache_hits") or 0 for r in records),
+        "cache_misses": sum(r.get("cache_misses") or 0 for r in records),
+        "history_tokens_saved": sum(r.get("history_tokens_saved") or 0 for r in records),
+        "speaker_rule_selections": sum(r.get("speaker_rule_selections") or 0 for r in records),
+        "speaker_llm_selections": sum(r.get("speaker_llm_selections") or 0 for r in records),
+        "errors": dict(Counter(r["error_class"] for r in records if r.get("error_class"))),
+        "early_stops": dict(Counter(r["stop_reason"].split(":")[0] for r in records if r.get("stop_reason"))),
+        "timings": {
+            stage: {"mean": sum(v) / len(v), "p50": _percentile(v, 0.5), "p90": _percentile(v, 0.9), "max": max(v)}
+            for stage, v in timings.items()
+        },
+    }
+
+
+def print_summary(summary: dict, out=sys.stdout):
+    n = summary["instances"]
+    out.write(f"Instances:     {n} ({summary['evaluated']} evaluated)\n")
+    out.write(f"Resolved:      {summary['resolved']}/{n} ({summary['resolve_rate']:.1%})\n")
+    out.write("FAIL_TO_PASS:  {}/{}\n".format(*summary["fail_to_pass_tests"]))
+    out.write("PASS_TO_PASS:  {}/{}\n".format(*summary["pass_to_pass_tests"]))
+    out.write(f"Total tokens:  {summary['total_tokens']}\n")
+    out.write(f"Total cost:    {summary['total_cost']:.4f} (billed {summary['billed_cost']:.4f})\n")
+    if summary["cache_hits"] or summary["cache_misses"]:
+        out.write(f"LLM cache:     {summary['cache_hits']} hits / {summary['cache_misses']} misses\n")
+    if summary["history_tokens_saved"]:
+        out.write(f"History:       {summary['history_tokens_saved']} prompt tokens saved by compaction\n")
+    if summary["speaker_rule_selections"]:
+        out.write(f"Speakers:      {summary['speaker_rule_selections']} chosen by rules / "
+                  f"{summary['speaker_llm_selections']} by LLM\n")
+    if summary["early_stops"]:
+        out.write("Early stops:\n")
+        for reason, count in sorted(summary["early_stops"].items(), key=lambda e: -e[1]):
+            out.write(f"  {reason:<30} {count}\n")
+    if summary["errors"]:
+        out.write("Errors:\n")
+        for error_class, count in sorted(summary["errors"].items(), key=lambda e: -e[1]):
+            out.write(f"  {error_class:<30} {count}\n")
+    if summary["timings"]:
+        out.write(f"{'Stage':<16}{'mean':>10}{'p50':>10}{'p90':>10}{'max':>10}\n")
+        for stage, t in summary["timings"].items():
+            out.write(f"{stage:<16}{t['mean']:>10.1f}{t['p50']:>10.1f}{t['p90']:>10.1f}{t['max']:>10.1f}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a run from the JSONL results store.")
+    parser.add_argument("path", nargs="?", default=RESULTS_FILE, help="Results file (default: logs/results.jsonl)")
+    parser.add_argument("--run-id", help="Only include records of this run (default: last run in the file)")
+    parser.add_argument("--all-runs", action="store_true", help="Include records of all runs")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    records = load_results(args.path)
+    run_id = args.run_id
+    if not run_id and not args.all_runs and records:
+        run_id = records[-1].get("run_id")
+    if run_id:
+        records = [r for r in records if r.get("run_id") == run_id]
+
+    summary = summarize(records)
+    if args.json:
+        # Nur JSON auf stdout, die Run-ID als Feld
+        print(json.dumps({"run_id": run_id, **summary}, indent=2))
+    else:
+        if run_id:
+            print(f"Run: {run_id}")
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
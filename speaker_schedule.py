@@ -0,0 +1,100 @@
+import re
+import threading
+
+# Erlaubte Übergänge zwischen den Sprechern (gelten auch für die LLM-Auswahl im Fallback)
+DEFAULT_TRANSITIONS = {
+    "User": ["Planner_Agent", "Coding_Agent"],
+    "Planner_Agent": ["User", "Coding_Agent"],
+    "Coding_Agent": ["User", "Planner_Agent"],
+}
+# Wer nach einer reinen Textnachricht eines Agents dran ist (Plan -> Code)
+DEFAULT_HANDOFFS = {
+    "Planner_Agent": "Coding_Agent",
+}
+
+_EXECUTABLE_BLOCK = re.compile(r"```(?:python|py|sh|bash|shell|console)[ \t]*\n", re.IGNORECASE)
+
+
+class SpeakerStateMachine:
+    """Rule-based speaker selection for the group chat (``GroupChat(speaker_selection_method=...)``).
+
+    Follows the intended flow plan -> code -> execute without a manager LLM call:
+
+    - tool calls go to the agent that can execute them,
+    - executable code blocks go to the executor (``User``),
+    - tool/execution results go back to the agent that asked for them,
+    - the task message goes to ``first_speaker``, a plan (text) is handed off to the coder.
+
+    Anything else falls back to autogen's LLM selection, restricted to ``transitions``.
+    """
+
+    def __init__(self, transitions: dict = None, handoffs: dict = None, first_speaker: str = "Planner_Agent",
+                 executor_name: str = "User"):
+        self.transitions = transitions or DEFAULT_TRANSITIONS
+        self.handoffs = DEFAULT_HANDOFFS if handoffs is None else handoffs
+        self.first_speaker = first_speaker
+        self.executor_name = executor_name
+        self._lock = threading.Lock()
+        self.rule_selections = 0
+        self.llm_selections = 0
+
+    def transitions_for(self, agents) -> dict:
+        """The transitions as ``{agent: [agents]}`` for ``allowed_or_disallowed_speaker_transitions``."""
+        by_name = {agent.name: agent for agent in agents}
+        return {
+            by_name[name]: [by_name[n] for n in targets if n in by_name]
+            for name, targets in self.transitions.items() if name in by_name
+        }
+
+    def _allowed(self, last_name, name) -> bool:
+        return name in self.transitions.get(last_name, [])
+
+    def _requester(self, messages):
+        # Der Agent, dessen Tool-Call/Code das letzte Ergebnis des Executors erzeugt hat
+        for message in reversed(messages[:-1]):
+            if message.get("name") != self.executor_name:
+                return message.get("name")
+        return None
+
+    def _next_name(self, last_speaker, groupchat):
+        messages = groupchat.messages
+        if not messages:
+            return self.first_speaker
+        message = messages[-1]
+        last_name = last_speaker.name
+
+        calls = [t["function"]["name"] for t in message.get("tool_calls") or [] if t.get("type") == "function"]
+        if message.get("function_call"):
+            calls.append(message["function_call"]["name"])
+        if calls:
+            executors = [a.name for a in groupchat.agents if a.can_execute_function(calls)]
+            return executors[0] if len(executors) == 1 else None
+
+        content = message.get("content")
+        content = content if isinstance(content, str) else ""
+        if last_name == self.executor_name:
+            if len(messages) == 1:
+                return self.first_speaker
+            # Tool-/Ausführungsergebnis zurück an den Auftraggeber
+            if message.get("tool_responses") or message.get("role") == "tool" or content.startswith("exitcode:"):
+                return self._requester(messages)
+            return None
+        if _EXECUTABLE_BLOCK.search(content):
+            return self.executor_name
+        return self.handoffs.get(last_name)
+
+    def select(self, last_speaker, groupchat):
+        name = self._next_name(last_speaker, groupchat)
+        if name and (self._allowed(last_speaker.name, name) or not groupchat.messages):
+            agent = next((a for a in groupchat.agents if a.name == name), None)
+            if agent is not None:
+                with self._lock:
+                    self.rule_selections += 1
+                return agent
+        with self._lock:
+            self.llm_selections += 1
+        return "auto"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"speaker_rule_selections": self.rule_selections, "speaker_llm_selections": self.llm_selections}
@@ -0,0 +1,18 @@
+def parse_task_indices(spec: str):
+    """Parse task indices like ``"1-10,15,20-30:5"`` (inclusive ranges, optional step)."""
+    indices = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        step = 1
+        if ":" in part:
+            part, step_str = part.split(":", 1)
+            step = int(step_str)
+        if "-" in part:
+            start, end = part.split("-", 1)
+            indices.extend(range(int(start), int(end) + 1, step))
+        else:
+            indices.append(int(part))
+    # Reihenfolge beibehalten, Duplikate entfernen
+    return list(dict.fromkeys(indices))
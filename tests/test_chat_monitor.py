@@ -0,0 +1,40 @@
+from chat_monitor import ChatMonitor
+
+
+def _msg(name, content):
+    return {"role": "user", "name": name, "content": content}
+
+
+def test_repeats_of_different_agents_do_not_add_up():
+    monitor = ChatMonitor()
+    messages = [
+        _msg("Planner_Agent", "Look at the parser module first."),
+        _msg("Coding_Agent", "I will change the tokenizer."),
+        _msg("Planner_Agent", "Look at the parser module first."),
+        _msg("Coding_Agent", "The tokenizer now handles escaped quotes."),
+        _msg("Coding_Agent", "I will change the tokenizer."),
+    ]
+    assert not monitor.check(messages)
+    assert monitor.stop_reason is None
+
+
+def test_new_message_resets_the_repeat_count():
+    monitor = ChatMonitor()
+    messages = [
+        _msg("Coding_Agent", "Running the tests now."),
+        _msg("Coding_Agent", "Running the tests now."),
+        _msg("Coding_Agent", "All tests pass, the fix is complete."),
+        _msg("Coding_Agent", "Running the tests now."),
+    ]
+    assert not monitor.check(messages)
+
+
+def test_agent_repeating_itself_stops_the_chat():
+    monitor = ChatMonitor()
+    messages = [
+        _msg("Coding_Agent", "Running the tests now."),
+        _msg("Coding_Agent", "Running the tests now."),
+        _msg("Coding_Agent", "Running the tests now."),
+    ]
+    assert monitor.check(messages)
+    assert monitor.stop_reason == "repeated_message: Coding_Agent repeated itself"
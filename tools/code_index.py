@@ -0,0 +1,322 @@
+import os
+import re
+import ast
+import pickle
+import threading
+import subprocess
+from collections import OrderedDict
+from typing_extensions import Annotated
+
+from tools.file_tool import FileTool, read_lines
+
+# Ein Basis-Index pro Commit, gebaut aus den Git-Objekten (nicht aus dem Arbeitsverzeichnis),
+# damit er unabhängig von den Änderungen der Agents ist und von allen Instanzen geteilt werden kann.
+INDEX_VERSION = 1
+INDEX_CACHE_DIR = os.path.abspath(os.path.join('.cache', 'code_index'))
+MAX_FILE_BYTES = 1_000_000
+MAX_RESULTS = 50
+INDEX_WAIT_TIMEOUT = 300
+# So viele Commit-Indizes bleiben im Speicher, ältere werden bei Bedarf wieder von Platte geladen
+MAX_INDEXES_IN_MEMORY = 8
+
+_IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+_bases = OrderedDict()
+_bases_lock = threading.Lock()
+
+
+def _git(args, cwd, **kwargs):
+    return subprocess.run(["git"] + args, cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           timeout=120, **kwargs)
+
+
+def _decode(data: bytes):
+    if b"\0" in data[:8000]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def python_symbols(text: str):
+    """Return ``[(qualname, kind, start_line, end_line)]`` for classes and functions."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    symbols = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = f"{prefix}{child.name}"
+                kind = "class" if isinstance(child, ast.ClassDef) else "def"
+                start = child.decorator_list[0].lineno if child.decorator_list else child.lineno
+                symbols.append((qualname, kind, start, getattr(child, "end_lineno", child.lineno)))
+                visit(child, qualname + ".")
+
+    visit(tree, "")
+    return symbols
+
+
+def _token_matches(token: str, fragment: str, open_left: bool, open_right: bool) -> bool:
+    if open_left and open_right:
+        return fragment in token
+    if open_left:
+        return token.endswith(fragment)
+    if open_right:
+        return token.startswith(fragment)
+    return token == fragment
+
+
+def _index_text(rel_path: str, text: str):
+    tokens = set(_IDENT.findall(text))
+    symbols = python_symbols(text) if rel_path.endswith(".py") else []
+    return tokens, symbols
+
+
+class RepoIndex:
+    """Immutable index of one commit: file list, symbol table and inverted identifier index."""
+
+    def __init__(self, commit, paths, symbols, inverted):
+        self.commit = commit
+        self.paths = paths          # alle Textdateien des Commits
+        self.symbols = symbols      # path -> [(qualname, kind, start, end)]
+        self.inverted = inverted    # identifier -> tuple(path ids)
+
+    @classmethod
+    def build(cls, repo_dir: str, commit: str) -> "RepoIndex":
+        listing = _git(["ls-tree", "-r", "-l", "-z", commit], repo_dir).stdout.decode("utf-8", errors="replace")
+        blobs = []
+        for entry in listing.split("\0"):
+            if not entry:
+                continue
+            meta, path = entry.split("\t", 1)
+            _, kind, sha, size = meta.split()
+            if kind == "blob" and size != "-" and int(size) <= MAX_FILE_BYTES:
+                blobs.append((path, sha))
+
+        paths, symbols, inverted = [], {}, {}
+        proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=repo_dir, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE)
+        try:
+            for path, sha in blobs:
+                proc.stdin.write(f"{sha}\n".encode())
+                proc.stdin.flush()
+                header = proc.stdout.readline().split()
+                size = int(header[2])
+                data = proc.stdout.read(size)
+                proc.stdout.read(1)
+                text = _decode(data)
+                if text is None:
+                    continue
+                path_id = len(paths)
+                paths.append(path)
+                tokens, file_symbols = _index_text(path, text)
+                if file_symbols:
+                    symbols[path] = file_symbols
+                for token in tokens:
+                    inverted.setdefault(token, []).append(path_id)
+        finally:
+            proc.stdin.close()
+            proc.wait()
+        return cls(commit, paths, symbols, {t: tuple(ids) for t, ids in inverted.items()})
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((INDEX_VERSION, self.commit, self.paths, self.symbols, self.inverted), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            version, commit, paths, symbols, inverted = pickle.load(f)
+        if version != INDEX_VERSION:
+            raise ValueError("outdated index format")
+        return cls(commit, paths, symbols, inverted)
+
+
+class _PendingIndex:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.index = None
+        self.error = None
+
+
+def _load_or_build(repo_dir: str, commit: str, pending: _PendingIndex, cache_dir: str):
+    cache_path = os.path.join(cache_dir, f"{commit}.pickle")
+    try:
+        if os.path.exists(cache_path):
+            try:
+                pending.index = RepoIndex.load(cache_path)
+                return
+            except Exception:
+                pass
+        pending.index = RepoIndex.build(repo_dir, commit)
+        pending.index.save(cache_path)
+    except Exception as e:
+        pending.error = e
+        with _bases_lock:
+            _bases.pop(commit, None)
+    finally:
+        pending.ready.set()
+
+
+def start_index(repo_dir: str, commit: str, cache_dir: str = INDEX_CACHE_DIR) -> _PendingIndex:
+    """Start building (or loading) the index of ``commit`` in the background; reused per commit."""
+    with _bases_lock:
+        pending = _bases.get(commit)
+        if pending is None:
+            pending = _bases[commit] = _PendingIndex()
+            threading.Thread(target=_load_or_build, args=(repo_dir, commit, pending, cache_dir),
+                             name=f"index-{commit[:8]}", daemon=True).start()
+        _bases.move_to_end(commit)
+        for old_commit in list(_bases)[:-MAX_INDEXES_IN_MEMORY]:
+            if _bases[old_commit].ready.is_set():
+                del _bases[old_commit]
+    return pending
+
+
+def get_index(repo_dir: str, commit: str, timeout: float = INDEX_WAIT_TIMEOUT) -> RepoIndex:
+    pending = start_index(repo_dir, commit)
+    if not pending.ready.wait(timeout):
+        raise TimeoutError(f"Index for {commit[:12]} is still being built")
+    if pending.error:
+        raise pending.error
+    return pending.index
+
+
+class CodeSearchTool:
+    """Code navigation for the agents on top of the shared commit index.
+
+    Files the agents changed since the indexed commit (``git diff`` plus untracked files)
+    are re-indexed on the fly and overlay the shared index.
+    """
+
+    def __init__(self, root_dir: str, commit: str = None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.commit = commit or _git(["rev-parse", "HEAD"], self.root_dir, text=True).stdout.strip()
+        self._overlay = {}  # path -> (mtime, tokens, symbols) oder None (gelöscht)
+        self._lock = threading.Lock()
+        self._files = FileTool(self.root_dir)
+        start_index(self.root_dir, self.commit)
+
+    def _refresh(self):
+        changed = _git(["diff", "--name-only", "-z", self.commit], self.root_dir, text=True).stdout.split("\0")
+        changed += _git(["ls-files", "--others", "--exclude-standard", "-z"], self.root_dir, text=True).stdout.split("\0")
+        changed = {p for p in changed if p}
+        with self._lock:
+            for path in changed:
+                full = os.path.join(self.root_dir, path)
+                try:
+                    mtime = os.stat(full).st_mtime_ns
+                except OSError:
+                    self._overlay[path] = None
+                    continue
+                entry = self._overlay.get(path)
+                if entry is not None and entry[0] == mtime:
+                    continue
+                with open(full, "rb") as f:
+                    text = _decode(f.read(MAX_FILE_BYTES + 1)[:MAX_FILE_BYTES])
+                self._overlay[path] = (mtime, *_index_text(path, text)) if text is not None else None
+            # Dateien, die wieder dem Commit entsprechen, kommen aus dem Basis-Index
+            for path in list(self._overlay):
+                if path not in changed:
+                    del self._overlay[path]
+            return dict(self._overlay)
+
+    def _view(self):
+        index = get_index(self.root_dir, self.commit)
+        return index, self._refresh()
+
+    def _all_paths(self, index, overlay):
+        paths = [p for p in index.paths if p not in overlay]
+        paths += [p for p, entry in overlay.items() if entry is not None]
+        return sorted(paths)
+
+    def _candidates(self, index, overlay, pattern: str):
+        # Für wörtliche Suchmuster: Dateien über den Identifier-Index eingrenzen. Ein Fragment am Rand
+        # des Musters kann Teil eines längeren Identifiers sein, eines in der Mitte nur ganz.
+        candidates = None
+        for match in re.finditer(r"[A-Za-z0-9_]{3,}", pattern):
+            fragment = match.group(0)
+            if not re.match(r"[A-Za-z_]", fragment):
+                continue
+            open_left = match.start() == 0
+            open_right = match.end() == len(pattern)
+            if open_left or open_right:
+                tokens = [t for t in index.inverted if _token_matches(t, fragment, open_left, open_right)]
+            else:
+                tokens = [fragment] if fragment in index.inverted else []
+            files = {index.paths[i] for t in tokens for i in index.inverted[t]}
+            files = {p for p in files if p not in overlay}
+            for path, entry in overlay.items():
+                if entry is not None and any(_token_matches(t, fragment, open_left, open_right) for t in entry[1]):
+                    files.add(path)
+            candidates = files if candidates is None else candidates & files
+        return candidates
+
+    def find_symbol(
+        self,
+        name: Annotated[str, "Class, function or method name, optionally qualified (e.g. 'Model.save')"],
+    ) -> str:
+        try:
+            index, overlay = self._view()
+            entries = [(p, s) for p, syms in index.symbols.items() if p not in overlay for s in syms]
+            entries += [(p, s) for p, entry in overlay.items() if entry is not None for s in entry[2]]
+            exact = [(p, s) for p, s in entries if s[0] == name or s[0].endswith("." + name)]
+            matches = exact or [(p, s) for p, s in entries if name.lower() in s[0].lower()]
+            if not matches:
+                return f"No symbol matching '{name}' found."
+            matches.sort(key=lambda m: (m[0], m[1][2]))
+            lines = [f"{p}:{s[2]}-{s[3]} {s[1]} {s[0]}" for p, s in matches[:MAX_RESULTS]]
+            if len(matches) > MAX_RESULTS:
+                lines.append(f"... {len(matches) - MAX_RESULTS} more matches, use a more specific name.")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"Error searching symbol: {e}"
+
+    def grep(
+        self,
+        pattern: Annotated[str, "Text or regular expression to search for"],
+        path: Annotated[str, "Only search files below this relative path (optional)"] = "",
+        max_results: Annotated[int, "Maximum number of matching lines"] = MAX_RESULTS,
+    ) -> str:
+        try:
+            try:
+                regex = re.compile(pattern)
+                literal = not any(c in _REGEX_META for c in pattern)
+            except re.error:
+                regex = re.compile(re.escape(pattern))
+                literal = True
+            index, overlay = self._view()
+            prefix = path.strip("/").replace(os.sep, "/")
+            candidates = self._candidates(index, overlay, pattern) if literal else None
+            paths = sorted(candidates) if candidates is not None else self._all_paths(index, overlay)
+            results = []
+            for rel in paths:
+                if prefix and not (rel == prefix or rel.startswith(prefix + "/")):
+                    continue
+                try:
+                    # Wie read_range: keine Dateien außerhalb des Repos (Symlinks der Agents)
+                    lines = read_lines(self._files._resolve(rel))
+                except (OSError, ValueError):
+                    continue
+                for number, line in enumerate(lines, 1):
+                    if regex.search(line):
+                        results.append(f"{rel}:{number}: {line.rstrip()[:200]}")
+                        if len(results) >= max_results:
+                            return "\n".join(results) + f"\n... stopped after {max_results} matches."
+            return "\n".join(results) if results else f"No matches for '{pattern}'."
+        except Exception as e:
+            return f"Error searching: {e}"
+
+    def read_range(
+        self,
+        path: Annotated[str, "File path relative to the repository root"],
+        start: Annotated[int, "First line (1-based)"] = 1,
+        end: Annotated[int, "Last line (inclusive)"] = 200,
+    ) -> str:
+        return self._files.read_range(path, start, end)
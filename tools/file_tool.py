@@ -1,44 +1,83 @@
 import os
-from autogen.agentchat.agent import ConversableAgentTool
+import threading
+from collections import OrderedDict
+from typing_extensions import Annotated
 
+# Gelesene Dateien bleiben als Zeilenliste im Speicher, bis sich mtime/Größe/Inode ändern
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+MAX_FILE_BYTES = 2_000_000
+MAX_READ_LINES = 400
+
+_cache = OrderedDict()  # Pfad -> ((mtime_ns, size, inode), Zeilen, Bytes)
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def _evict():
+    global _cache_bytes
+    while _cache_bytes > MAX_CACHED_BYTES and _cache:
+        _, (_, _, size) = _cache.popitem(last=False)
+        _cache_bytes -= size
+
+
+def read_lines(full_path: str):
+    """Lines of a text file (without line endings), served from the mtime-keyed cache.
+
+    Raises ``ValueError`` for binary and too large files.
+    """
+    global _cache_bytes
+    st = os.stat(full_path)
+    # PatchTool ersetzt Dateien per os.replace – der Inode ändert sich auch bei gleicher mtime
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _cache_lock:
+        entry = _cache.get(full_path)
+        if entry is not None and entry[0] == key:
+            _cache.move_to_end(full_path)
+            return entry[1]
+    if st.st_size > MAX_FILE_BYTES:
+        raise ValueError(f"file is too large ({st.st_size} bytes), use grep to find the relevant lines")
+    with open(full_path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:8000]:
+        raise ValueError("binary file")
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    with _cache_lock:
+        previous = _cache.pop(full_path, None)
+        if previous is not None:
+            _cache_bytes -= previous[2]
+        _cache[full_path] = (key, lines, len(data))
+        _cache_bytes += len(data)
+        _evict()
+    return lines
+
+
+class FileTool:
+    """Host-side, read-only file access for the agents (no code execution round trip)."""
 
-class FileTool(ConversableAgentTool):
     def __init__(self, root_dir: str):
-        super().__init__(
-            name="FileTool",
-            description=(
-                "Read or write a file inside the project directory. "
-                "Use `read <relative_path>` to read a file, and `write <relative_path> <content>` to overwrite it."
-            )
-        )
         self.root_dir = os.path.abspath(root_dir)
 
-    def _run(self, command: str) -> str:
-        parts = command.strip().split(" ", 2)
-        if len(parts) < 2:
-            return "Invalid command. Use `read <file>` or `write <file> <content>`"
-
-        action, rel_path = parts[0], parts[1]
+    def _resolve(self, rel_path: str) -> str:
         path = os.path.abspath(os.path.join(self.root_dir, rel_path))
+        # Sicherheit: Nur im erlaubten Verzeichnis (auch nicht über Symlinks hinaus)
+        real_root = os.path.realpath(self.root_dir)
+        if os.path.commonpath([os.path.realpath(path), real_root]) != real_root:
+            raise ValueError(f"Access denied: {rel_path} is outside of the repository.")
+        return path
 
-        # Sicherheit: Nur im erlaubten Verzeichnis
-        if not path.startswith(self.root_dir):
-            return "Access denied: file is outside of root directory."
-
-        if action == "read":
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    return f.read()
-            except Exception as e:
-                return f"Error reading file: {e}"
-
-        elif action == "write" and len(parts) == 3:
-            content = parts[2]
-            try:
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                return f"Successfully wrote to {rel_path}."
-            except Exception as e:
-                return f"Error writing file: {e}"
-
-        return "Invalid command. Use `read <file>` or `write <file> <content>`"
+    def read_range(
+        self,
+        path: Annotated[str, "File path relative to the repository root"],
+        start: Annotated[int, "First line (1-based)"] = 1,
+        end: Annotated[int, "Last line (inclusive)"] = 200,
+    ) -> str:
+        try:
+            lines = read_lines(self._resolve(path))
+            start = max(1, start)
+            end = min(end, start + MAX_READ_LINES - 1, len(lines))
+            if start > end:
+                return f"{path} has {len(lines)} lines; requested range {start}-{end} is empty."
+            numbered = [f"{number:>6}  {lines[number - 1]}" for number in range(start, end + 1)]
+            return f"{path} (lines {start}-{end} of {len(lines)})\n" + "\n".join(numbered)
+        except Exception as e:
+            return f"Error reading file: {e}"
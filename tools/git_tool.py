@@ -1,36 +1,75 @@
-import subprocess
+import os
 import shlex
-from autogen.agentchat.agent import ConversableAgentTool
-
-class GitTool(ConversableAgentTool):
-    def __init__(self, name="GitTool", repo_path=".", description=None):
-        if description is None:
-            description = (
-                "Use this tool to run git commands in the repository, e.g.:\n"
-                " - status\n"
-                " - diff\n"
-                " - checkout <branch_or_hash>\n"
-                " - add .\n"
-                " - commit -m 'your commit message'\n"
-                "Input must be a valid git command without the prefix 'git'."
-            )
-        super().__init__(name=name, description=description)
-        self.repo_path = repo_path
+import subprocess
+from typing_extensions import Annotated
+
+GIT_TIMEOUT = 20  # Sekunden
+MAX_OUTPUT_CHARS = 20000
+# Nur lesende Befehle – kein checkout/add/commit/reset, das Arbeitsverzeichnis gehört den Agents
+READ_ONLY_COMMANDS = {"status", "diff", "log", "show", "blame", "ls-files", "ls-tree", "grep", "rev-parse",
+                      "describe", "shortlog", "cat-file"}
+# Optionen, die Dateien schreiben oder externe Programme starten
+FORBIDDEN_OPTIONS = ("--output", "-O", "--open-files-in-pager", "--ext-diff", "--exec", "--textconv")
+# Optionen, die Dateien außerhalb des Repositorys lesen
+FORBIDDEN_OPTIONS += ("--contents", "--no-index")
+# Exit-Code 1 heißt bei diesen Befehlen "keine Treffer" bzw. "Unterschiede", kein Fehler
+NO_MATCH_EXIT_CODES = {"grep": "(no matches)", "diff": "(files differ)"}
+
+
+class GitTool:
+    """Read-only git queries (history, blame, diff) with a timeout and bounded output."""
 
-    def _run(self, command: str) -> str:
+    def __init__(self, repo_dir: str, timeout: int = GIT_TIMEOUT):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self.timeout = timeout
+
+    def _outside_repo(self, arg: str) -> bool:
+        # Vorhandene Pfade (auch als Optionswert, --opt=pfad) dürfen nicht aus dem Repository herausführen,
+        # auch nicht über Symlinks; Revisionen wie HEAD~3..HEAD bleiben als Pfad im Repository
+        value = arg.split("=", 1)[1] if arg.startswith("-") and "=" in arg else arg
+        if not value or (arg.startswith("-") and value == arg):
+            return False
+        real_root = os.path.realpath(self.repo_dir)
+        path = os.path.realpath(os.path.join(self.repo_dir, value))
+        return os.path.commonpath([path, real_root]) != real_root and os.path.exists(path)
+
+    def git(
+        self,
+        command: Annotated[str, "Read-only git command without the 'git' prefix, e.g. 'log -5 --oneline -- path' "
+                                "or 'blame -L 10,30 path'"],
+    ) -> str:
+        try:
+            args = shlex.split(command)
+        except ValueError as e:
+            return f"Error parsing command: {e}"
+        if args and args[0] == "git":
+            args = args[1:]
+        if not args or args[0] not in READ_ONLY_COMMANDS:
+            return (f"Error: only read-only git commands are allowed ({', '.join(sorted(READ_ONLY_COMMANDS))}).")
+        for arg in args[1:]:
+            if arg.split("=", 1)[0] in FORBIDDEN_OPTIONS or (arg.startswith("-O") and args[0] == "grep"):
+                return f"Error: option {arg} is not allowed."
+            if self._outside_repo(arg):
+                return f"Error: {arg} is outside of the repository."
+
+        env = os.environ.copy()
+        env.update({"GIT_PAGER": "cat", "GIT_TERMINAL_PROMPT": "0", "GIT_OPTIONAL_LOCKS": "0"})
         try:
-            git_cmd = ["git"] + shlex.split(command)
             result = subprocess.run(
-                git_cmd,
-                cwd=self.repo_path,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=15,
+                ["git", "--no-pager", "-c", "color.ui=never"] + args,
+                cwd=self.repo_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                timeout=self.timeout,
             )
-            if result.returncode == 0:
-                return result.stdout.strip()
-            else:
-                return f"[stderr]\n{result.stderr.strip()}"
-        except Exception as e:
-            return f"[error] {str(e)}"
+        except subprocess.TimeoutExpired:
+            return f"Error: git {args[0]} timed out after {self.timeout}s – narrow it down (paths, -n, -L)."
+        except OSError as e:
+            return f"Error running git: {e}"
+
+        output = result.stdout.decode("utf-8", errors="replace")
+        if result.returncode == 1 and args[0] in NO_MATCH_EXIT_CODES and not result.stderr.strip():
+            return output.strip() or NO_MATCH_EXIT_CODES[args[0]]
+        if result.returncode != 0:
+            return f"Error (exit code {result.returncode}): {result.stderr.decode('utf-8', errors='replace').strip()}"
+        if len(output) > MAX_OUTPUT_CHARS:
+            output = output[:MAX_OUTPUT_CHARS] + f"\n... output truncated after {MAX_OUTPUT_CHARS} characters."
+        return output.strip() or "(no output)"
@@ -1,27 +1,103 @@
 import os
-from autogen.agentchat.agent import ConversableAgentTool
+import subprocess
+from typing_extensions import Annotated
+
+MAX_DEPTH = 4
+MAX_ENTRIES = 300
+# Immer ausgeblendet, auch wenn das Repo sie nicht in .gitignore hat
+IGNORED_NAMES = {".git", "__pycache__", ".pytest_cache", ".mypy_cache", ".tox", ".nox", ".venv", "node_modules",
+                 ".eggs", ".cache"}
+
+
+def _ignored(name: str) -> bool:
+    return name in IGNORED_NAMES or name.endswith((".egg-info", ".pyc"))
+
+
+class ListDirectoryTool:
+    """Directory listing with a depth limit that honours ``.gitignore`` and skips build/cache folders."""
 
-class ListDirectoryTool(ConversableAgentTool):
     def __init__(self, root_dir: str):
-        super().__init__(
-            name="ListDirectoryTool",
-            description="List the contents of a directory. Usage: `ls [relative_path]`"
-        )
         self.root_dir = os.path.abspath(root_dir)
 
-    def _run(self, command: str) -> str:
-        rel_path = command.strip() if command else "."
+    def _resolve(self, rel_path: str) -> str:
         path = os.path.abspath(os.path.join(self.root_dir, rel_path))
+        # Sicherheit: Nur im erlaubten Verzeichnis (auch nicht über Symlinks hinaus)
+        real_root = os.path.realpath(self.root_dir)
+        if os.path.commonpath([os.path.realpath(path), real_root]) != real_root:
+            raise ValueError(f"Access denied: {rel_path} is outside of the repository.")
+        return path
 
-        # Sicherheit
-        if not path.startswith(self.root_dir):
-            return "Access denied: directory is outside of root directory."
+    def _git_files(self, path: str):
+        # Versionierte + neue, nicht ignorierte Dateien; None, wenn kein Git-Repo
+        try:
+            result = subprocess.run(
+                ["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z", "--", "."],
+                cwd=path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=20,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return [p for p in result.stdout.decode("utf-8", errors="replace").split("\0") if p]
 
-        if not os.path.isdir(path):
-            return f"'{rel_path}' is not a valid directory."
+    def _walk_files(self, path: str, depth: int):
+        files = []
+        for current, dirs, names in os.walk(path):
+            rel = os.path.relpath(current, path)
+            level = 0 if rel == "." else rel.count(os.sep) + 1
+            dirs[:] = [d for d in dirs if not _ignored(d)] if level < depth else []
+            files += [os.path.normpath(os.path.join(rel, n)).replace(os.sep, "/") for n in names if not _ignored(n)]
+        return files
 
+    def list_directory(
+        self,
+        path: Annotated[str, "Directory relative to the repository root"] = ".",
+        depth: Annotated[int, "How many directory levels to show (1 = only direct entries)"] = 2,
+    ) -> str:
         try:
-            entries = os.listdir(path)
-            return "\n".join(entries)
+            full = self._resolve(path)
+            if not os.path.isdir(full):
+                return f"Error: '{path}' is not a directory."
+            depth = max(1, min(depth, MAX_DEPTH))
+            files = self._git_files(full)
+            if files is None:
+                files = self._walk_files(full, depth)
+
+            # Baum aus den Dateipfaden: Verzeichnisse unterhalb der Tiefe werden nur gezählt
+            tree = {}
+            for rel in files:
+                parts = rel.split("/")
+                if any(_ignored(p) for p in parts):
+                    continue
+                node = tree
+                for level, part in enumerate(parts[:-1], 1):
+                    node = node.setdefault(part + "/", {})
+                    if level == depth:
+                        node[""] = node.get("", 0) + 1
+                        break
+                else:
+                    node[parts[-1]] = None
+
+            lines = []
+
+            def render(node, indent):
+                for name in sorted(node, key=lambda n: (not n.endswith("/"), n)):
+                    if name == "":
+                        continue
+                    if len(lines) >= MAX_ENTRIES:
+                        return
+                    child = node[name]
+                    hidden = child.get("", 0) if child is not None else 0
+                    suffix = f"  ({hidden} files)" if hidden else ""
+                    lines.append(f"{indent}{name}{suffix}")
+                    if child:
+                        render(child, indent + "  ")
+
+            render(tree, "")
+            if not lines:
+                return f"'{path}' is empty."
+            if len(lines) >= MAX_ENTRIES:
+                lines.append(f"... listing stopped after {MAX_ENTRIES} entries, list a subdirectory or reduce depth.")
+            return "\n".join(lines)
         except Exception as e:
             return f"Error listing directory: {e}"
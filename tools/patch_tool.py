@@ -0,0 +1,278 @@
+import os
+import re
+import difflib
+import tempfile
+from typing_extensions import Annotated
+
+# Mindest-Ähnlichkeit, ab der ein Block auch bei kleinen Abweichungen als Treffer gilt
+FUZZY_THRESHOLD = 0.92
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    pass
+
+
+def _split(text: str):
+    eol = "\r\n" if "\r\n" in text else "\n"
+    return text.splitlines(), eol, text.endswith(("\n", "\r"))
+
+
+def _join(lines, eol, trailing_newline):
+    text = eol.join(lines)
+    return text + eol if trailing_newline and lines else text
+
+
+def _indent(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _reindent(new_lines, found_lines, old_lines):
+    # Wurde nur über die Einrückung gematcht, die Ersetzung genauso verschieben wie den Treffer
+    old_first = next((l for l in old_lines if l.strip()), None)
+    found_first = next((l for l in found_lines if l.strip()), None)
+    if old_first is None or found_first is None:
+        return new_lines
+    old_indent, found_indent = _indent(old_first), _indent(found_first)
+    if old_indent == found_indent:
+        return new_lines
+    result = []
+    for line in new_lines:
+        if line.startswith(old_indent):
+            result.append(found_indent + line[len(old_indent):] if line.strip() else line)
+        else:
+            result.append(line)
+    return result
+
+
+def _closest(candidates, hint):
+    if hint is None:
+        return candidates if len(candidates) == 1 else []
+    best = min(candidates, key=lambda c: abs(c - hint))
+    return [best]
+
+
+def locate(file_lines, old_lines, hint=None):
+    """Find ``old_lines`` in ``file_lines``; return ``(start, mode)``.
+
+    Tries an exact match, then ignoring trailing whitespace, then ignoring indentation and
+    finally a fuzzy match. If the block occurs several times, the occurrence closest to the
+    line ``hint`` wins; without a hint the match must be unique.
+    """
+    n = len(old_lines)
+    if n == 0:
+        if hint is None:
+            raise PatchError("Empty search block – add some context lines so the location is unambiguous.")
+        return max(0, min(hint, len(file_lines))), "exact"
+
+    for mode, norm in (("exact", lambda l: l), ("whitespace", str.rstrip), ("indentation", str.strip)):
+        target = [norm(l) for l in old_lines]
+        normalized = [norm(l) for l in file_lines]
+        candidates = [i for i in range(len(file_lines) - n + 1) if normalized[i:i + n] == target]
+        if candidates:
+            chosen = _closest(candidates, hint)
+            if not chosen:
+                raise PatchError(
+                    f"The search block occurs {len(candidates)} times (lines "
+                    f"{', '.join(str(c + 1) for c in candidates[:5])}). Add more surrounding lines to make it unique."
+                )
+            return chosen[0], mode
+
+    target = "\n".join(l.strip() for l in old_lines)
+    scored = []
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    for i in range(len(file_lines) - n + 1):
+        matcher.set_seq1("\n".join(l.strip() for l in file_lines[i:i + n]))
+        if matcher.real_quick_ratio() < FUZZY_THRESHOLD or matcher.quick_ratio() < FUZZY_THRESHOLD:
+            continue
+        scored.append((matcher.ratio(), i))
+    scored.sort(reverse=True)
+    matches = [i for ratio, i in scored if ratio >= FUZZY_THRESHOLD]
+    if matches:
+        # Bei mehreren fast gleich guten Treffern ohne Hinweis ablehnen
+        if hint is None and len(scored) > 1 and scored[0][0] - scored[1][0] < 0.02 and scored[1][0] >= FUZZY_THRESHOLD:
+            raise PatchError("The search block matches several places almost equally well. Add more context lines.")
+        return (_closest(matches, hint) or [matches[0]])[0], "fuzzy"
+
+    message = "The search block was not found in the file."
+    if scored:
+        ratio, i = scored[0]
+        message += f" Closest match at line {i + 1} ({ratio:.0%} similar):\n" + "\n".join(file_lines[i:i + n][:10])
+    raise PatchError(message + "\nRead the current file content and retry with the exact lines.")
+
+
+def replace_block(file_lines, old_lines, new_lines, hint=None):
+    start, mode = locate(file_lines, old_lines, hint)
+    found = file_lines[start:start + len(old_lines)]
+    if mode in ("indentation", "fuzzy"):
+        new_lines = _reindent(new_lines, found, old_lines)
+    return file_lines[:start] + list(new_lines) + file_lines[start + len(old_lines):], start
+
+
+def parse_unified_diff(patch: str):
+    """Parse a (possibly multi-file) unified diff into ``[(old_path, new_path, hunks)]``."""
+    files = []
+    current = None
+    hunk = None
+    for line in patch.splitlines():
+        if line.startswith("--- ") and (hunk is None or _hunk_done(hunk)):
+            current = [_strip_prefix(line[4:]), None, []]
+            files.append(current)
+            hunk = None
+        elif line.startswith("+++ ") and current is not None and current[1] is None:
+            current[1] = _strip_prefix(line[4:])
+        elif line.startswith("@@"):
+            if current is None:
+                raise PatchError("Hunk without file header – start the patch with '--- a/<path>' and '+++ b/<path>'.")
+            match = _HUNK_HEADER.match(line)
+            hunk = {
+                "old_start": int(match.group(1)) if match else None,
+                "old_len": int(match.group(2) or 1) if match else None,
+                "new_len": int(match.group(4) or 1) if match else None,
+                "old": [],
+                "new": [],
+            }
+            current[2].append(hunk)
+        elif hunk is not None:
+            if line.startswith("\\"):
+                continue
+            tag, text = (line[0], line[1:]) if line else (" ", "")
+            if tag == " ":
+                hunk["old"].append(text)
+                hunk["new"].append(text)
+            elif tag == "-":
+                hunk["old"].append(text)
+            elif tag == "+":
+                hunk["new"].append(text)
+            else:
+                # Zeile ohne Präfix: als Kontext behandeln (LLMs lassen das Leerzeichen oft weg)
+                hunk["old"].append(line)
+                hunk["new"].append(line)
+    if not files:
+        raise PatchError("No file header found. Use the unified diff format: '--- a/<path>', '+++ b/<path>', '@@ ... @@'.")
+    return [(old, new, hunks) for old, new, hunks in files]
+
+
+def _hunk_done(hunk):
+    # Ein "--- " innerhalb eines Hunks ist eine gelöschte Zeile, solange der Hunk nicht vollständig ist
+    if hunk["old_len"] is None:
+        return True
+    return len(hunk["old"]) >= hunk["old_len"] and len(hunk["new"]) >= hunk["new_len"]
+
+
+def _strip_prefix(path: str) -> str:
+    path = path.split("\t")[0].strip()
+    if path != "/dev/null" and path[:2] in ("a/", "b/"):
+        path = path[2:]
+    return path
+
+
+class PatchTool:
+    """Edit files with search/replace blocks or unified diffs instead of full rewrites.
+
+    All files touched by one call are written atomically (temporary file + ``os.replace``);
+    if any hunk fails, nothing is written and the error explains what did not match.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = os.path.abspath(root_dir)
+
+    def _resolve(self, rel_path: str) -> str:
+        path = os.path.abspath(os.path.join(self.root_dir, rel_path))
+        # Wie FileTool: auch nicht über Symlinks aus dem Repository hinaus
+        real_root = os.path.realpath(self.root_dir)
+        if os.path.commonpath([os.path.realpath(path), real_root]) != real_root:
+            raise PatchError(f"Access denied: {rel_path} is outside of the repository.")
+        return path
+
+    def _read(self, path: str):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def _commit(self, changes):
+        # Erst alle Dateien vorbereiten, dann gemeinsam ersetzen
+        staged = []
+        try:
+            for path, content in changes.items():
+                if content is None:
+                    staged.append((path, None))
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".patch-")
+                with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                    f.write(content)
+                if os.path.exists(path):
+                    os.chmod(tmp_path, os.stat(path).st_mode)
+                staged.append((path, tmp_path))
+        except Exception:
+            for _, tmp_path in staged:
+                if tmp_path:
+                    os.unlink(tmp_path)
+            raise
+        for path, tmp_path in staged:
+            if tmp_path is None:
+                os.unlink(path)
+            else:
+                os.replace(tmp_path, path)
+
+    def replace_in_file(
+        self,
+        path: Annotated[str, "File path relative to the repository root"],
+        search: Annotated[str, "Exact lines currently in the file (include a few unchanged lines for context)"],
+        replace: Annotated[str, "Lines that replace the search block"],
+    ) -> str:
+        try:
+            full = self._resolve(path)
+            if not os.path.isfile(full):
+                if search.strip():
+                    raise PatchError(f"{path} does not exist. Use an empty search block to create it.")
+                self._commit({full: replace if replace.endswith("\n") else replace + "\n"})
+                return f"Created {path}."
+            lines, eol, trailing = _split(self._read(full))
+            new_lines, start = replace_block(lines, search.splitlines(), replace.splitlines())
+            self._commit({full: _join(new_lines, eol, trailing)})
+            return f"Edited {path} at line {start + 1}."
+        except PatchError as e:
+            return f"Edit rejected: {e}"
+        except Exception as e:
+            return f"Error editing {path}: {e}"
+
+    def apply_patch(
+        self,
+        patch: Annotated[str, "Unified diff ('--- a/<path>', '+++ b/<path>', '@@ -l,n +l,n @@' hunks), may cover several files"],
+    ) -> str:
+        try:
+            changes = {}
+            summary = []
+            for old_path, new_path, hunks in parse_unified_diff(patch):
+                target = new_path if new_path and new_path != "/dev/null" else old_path
+                full = self._resolve(target)
+                if new_path == "/dev/null":
+                    changes[full] = None
+                    summary.append(f"deleted {target}")
+                    continue
+                if old_path == "/dev/null" or not os.path.exists(full):
+                    if old_path != "/dev/null":
+                        raise PatchError(f"{target} does not exist.")
+                    lines, eol, trailing = [], "\n", True
+                else:
+                    lines, eol, trailing = _split(changes[full] if full in changes else self._read(full))
+                offset = 0
+                for number, hunk in enumerate(hunks, 1):
+                    hint = max(0, hunk["old_start"] - 1) + offset if hunk["old_start"] is not None else None
+                    try:
+                        lines, start = replace_block(lines, hunk["old"], hunk["new"], hint)
+                    except PatchError as e:
+                        raise PatchError(f"Hunk {number} of {target} did not apply: {e}")
+                    if hint is not None:
+                        offset += (start - hint) + len(hunk["new"]) - len(hunk["old"])
+                changes[full] = _join(lines, eol, trailing)
+                summary.append(f"{target} ({len(hunks)} hunk(s))")
+            self._commit(changes)
+            return "Patch applied: " + ", ".join(summary) + "."
+        except PatchError as e:
+            return f"Patch rejected, no files were changed: {e}"
+        except Exception as e:
+            return f"Error applying patch, no files were changed: {e}"
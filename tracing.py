@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+
+TRACE_DIR = os.path.abspath(os.path.join('logs', 'traces'))
+
+# Spur (Zeile im Trace-Viewer), auf der Spans landen – pro Task gesetzt, damit alle Stufen einer
+# Instanz untereinander stehen, egal in welchem Thread sie laufen (asyncio.to_thread kopiert den Kontext).
+current_track = contextvars.ContextVar("current_track", default=None)
+
+
+class Tracer:
+    """Write spans as complete events in the Chrome trace format (chrome://tracing, Perfetto).
+
+    Events are appended to a JSON array as they finish, so a crashed run still leaves a
+    readable trace (the closing bracket is optional in this format).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._first = True
+        self._pid = os.getpid()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._file.flush()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._start) * 1e6
+
+    def _tid(self):
+        track = current_track.get()
+        return track if track is not None else threading.get_ident()
+
+    def _write(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line if self._first else ",\n" + line)
+            self._first = False
+            self._file.flush()
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = "stage", **args):
+        start = self._now_us()
+        error = None
+        try:
+            yield args
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if error is not None:
+                args["error"] = type(error).__name__
+            self._write({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": round(start, 1),
+                "dur": round(self._now_us() - start, 1),
+                "pid": self._pid,
+                "tid": self._tid(),
+                "args": args,
+            })
+
+    def name_track(self, track, name: str):
+        self._write({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": track, "args": {"name": name}})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write("\n]\n")
+                self._file.close()
+
+
+_tracer = None
+
+
+def init_tracing(path: str) -> Tracer:
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def shutdown_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def span(name: str, cat: str = "stage", **args):
+    """Context manager recording a span on the active tracer (no-op if tracing is disabled).
+
+    The yielded dict can be filled with further attributes (e.g. token counts) before the span ends.
+    """
+    if _tracer is None:
+        return contextlib.nullcontext(args)
+    return _tracer.span(name, cat, **args)
+
+
+def set_track(track, name: str = None):
+    current_track.set(track)
+    if _tracer is not None and name:
+        _tracer.name_track(track, name)
+
+
+def traced(func, name: str, cat: str = "stage", **args):
+    """Wrap ``func`` so every call is recorded as a span."""
+    if getattr(func, "__traced__", False):
+        return func
+
+    def wrapper(*a, **kw):
+        with span(name, cat, **args):
+            return func(*a, **kw)
+
+    wrapper.__traced__ = True
+    wrapper.__wrapped__ = func
+    return wrapper
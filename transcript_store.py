@@ -0,0 +1,135 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+
+TRANSCRIPT_DIR = os.path.abspath(os.path.join('logs', 'transcripts'))
+# Kürzere Inhalte lohnen das Hashen nicht
+MIN_SHARED_CHARS = 256
+
+
+def transcript_path(instance_id: str, transcript_dir: str = TRANSCRIPT_DIR) -> str:
+    return os.path.join(transcript_dir, f"{instance_id}.jsonl.gz")
+
+
+class ContentStore:
+    """Process-wide, content-addressed store for message contents.
+
+    Every agent keeps its own message dicts, and the same tool output or file content is
+    often produced several times. :meth:`intern` returns one shared string object per
+    distinct content, so the copies in all agents (and in concurrent chats) cost memory once.
+    Entries are reference counted per chat and dropped when the last chat releases them.
+    """
+
+    def __init__(self, min_chars: int = MIN_SHARED_CHARS):
+        self.min_chars = min_chars
+        self._lock = threading.Lock()
+        self._contents = {}  # Digest -> geteilter String
+        self._refs = Counter()
+
+    def intern(self, content, refs: Counter = None):
+        """Return the shared copy of ``content``; ``refs`` collects the chat's references."""
+        if not isinstance(content, str) or len(content) < self.min_chars:
+            return content
+        digest = hashlib.sha1(content.encode("utf-8", errors="surrogatepass")).digest()
+        with self._lock:
+            shared = self._contents.setdefault(digest, content)
+            if refs is not None:
+                if not refs[digest]:
+                    self._refs[digest] += 1
+                refs[digest] += 1
+        return shared
+
+    def release(self, refs: Counter):
+        with self._lock:
+            for digest in refs:
+                self._refs[digest] -= 1
+                if self._refs[digest] <= 0:
+                    del self._refs[digest]
+                    self._contents.pop(digest, None)
+        refs.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._contents), "chars": sum(len(c) for c in self._contents.values())}
+
+
+shared_contents = ContentStore()
+
+
+class TranscriptWriter:
+    """Streams the messages of one chat into a gzip-compressed JSONL file while it runs.
+
+    :meth:`process_message` is meant as autogen ``process_message_before_send`` hook and
+    replaces message contents by their shared copy from the :class:`ContentStore`;
+    :meth:`append` writes a group chat message to the transcript. :meth:`close` finishes the
+    file and releases the chat's contents from the store.
+    """
+
+    def __init__(self, path: str = None, store: ContentStore = shared_contents):
+        self.path = path
+        self.store = store
+        self.messages = 0
+        self.content_chars = 0
+        self.shared_chars = 0
+        self._refs = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def _intern(self, content):
+        shared = self.store.intern(content, self._refs)
+        if shared is not content:
+            self.shared_chars += len(content)
+        return shared
+
+    def process_message(self, sender, message, recipient, silent):
+        if isinstance(message, str):
+            return self._intern(message)
+        if not isinstance(message, dict):
+            return message
+        message = dict(message)
+        message["content"] = self._intern(message.get("content"))
+        # Tool-Antworten stehen zusätzlich einzeln in tool_responses
+        if message.get("tool_responses"):
+            message["tool_responses"] = [
+                dict(r, content=self._intern(r.get("content"))) for r in message["tool_responses"]
+            ]
+        return message
+
+    def append(self, message: dict):
+        content = message.get("content")
+        with self._lock:
+            self.messages += 1
+            self.content_chars += len(content) if isinstance(content, str) else 0
+            if self._file is not None:
+                entry = {"time": round(time.time(), 3), **message}
+                self._file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def stats(self) -> dict:
+        return {"transcript_messages": self.messages, "transcript_chars": self.content_chars,
+                "shared_content_chars": self.shared_chars}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.store.release(self._refs)
+
+
+def load_transcript(path: str):
+    """Read a transcript back; a file cut off by a crash yields the complete lines before the cut."""
+    messages = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                messages.append(json.loads(line))
+    except (EOFError, json.JSONDecodeError):
+        pass
+    return messages
@@ -0,0 +1,158 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+WORK_QUEUE_FILE = os.path.abspath(os.path.join('logs', 'work_queue.sqlite'))
+LEASE_TTL = 120  # Sekunden ohne Heartbeat, bis eine Instanz neu vergeben wird
+MAX_ATTEMPTS = 3
+
+# Zustände einer Instanz in der Queue
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+class WorkQueue:
+    """Durable (SQLite) queue of task indices for the coordinator, with leases.
+
+    A worker leases one index at a time and must renew the lease (heartbeat) before it expires.
+    Expired leases – the worker died or lost its connection – go back to ``pending`` until an
+    index has been leased ``max_attempts`` times; then it is marked ``failed``.
+    The queue survives a coordinator restart: finished indices stay finished, open leases keep
+    their expiry time.
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_FILE, lease_ttl: float = LEASE_TTL, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " task_index INTEGER PRIMARY KEY, state TEXT NOT NULL, lease_id TEXT, worker TEXT,"
+            " lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, task_index)")
+        self._conn.commit()
+
+    def add(self, indices, reset: bool = False):
+        """Enqueue ``indices``; already known ones keep their state unless ``reset`` is set."""
+        now = time.time()
+        verb = "INSERT OR REPLACE" if reset else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(
+                f"{verb} INTO tasks (task_index, state, attempts, updated_at) VALUES (?, ?, 0, ?)",
+                [(index, PENDING, now) for index in indices],
+            )
+            self._conn.commit()
+
+    def _expire(self, now):
+        # Abgelaufene Leases: zurück in die Queue oder endgültig fehlgeschlagen
+        self._conn.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+            " lease_id = NULL, worker = NULL, lease_expires = NULL, updated_at = ?"
+            " WHERE state = ? AND lease_expires < ?",
+            (self.max_attempts, FAILED, PENDING, now, LEASED, now),
+        )
+
+    def lease(self, worker: str, indices=None):
+        """Lease the lowest pending index (optionally restricted to ``indices``).
+
+        Returns ``(index, lease_id)`` or ``None`` if nothing is pending right now.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            query = "SELECT task_index FROM tasks WHERE state = ?"
+            params = [PENDING]
+            if indices is not None:
+                query += f" AND task_index IN ({','.join('?' * len(indices))})"
+                params += list(indices)
+            row = self._conn.execute(query + " ORDER BY task_index LIMIT 1", params).fetchone()
+            if row is None:
+                self._conn.commit()
+                return None
+            lease_id = uuid.uuid4().hex
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_id = ?, worker = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE task_index = ?",
+                (LEASED, lease_id, worker, now + self.lease_ttl, now, row[0]),
+            )
+            self._conn.commit()
+        return row[0], lease_id
+
+    def heartbeat(self, index: int, lease_id: str) -> bool:
+        """Extend a lease; ``False`` if it expired and was handed out again."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE task_index = ? AND lease_id = ? AND state = ?",
+                (now + self.lease_ttl, now, index, lease_id, LEASED),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def complete(self, index: int) -> bool:
+        """Mark an index as done. A late result of an expired lease is accepted as long as no
+        other worker finished the index first; returns ``False`` if the result is a duplicate."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_id = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE task_index = ? AND state != ?",
+                (DONE, time.time(), index, DONE),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def retry(self, index: int) -> bool:
+        """Put an index back after a failed attempt; the attempt counts, after ``max_attempts`` the
+        index is marked ``failed``. Returns ``False`` if another worker already finished it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " lease_id = NULL, worker = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE task_index = ? AND state != ?",
+                (self.max_attempts, FAILED, PENDING, time.time(), index, DONE),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def release(self, index: int, lease_id: str):
+        """Give a lease back without counting it as an attempt (worker shutting down)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_id = NULL, worker = NULL, lease_expires = NULL,"
+                " attempts = MAX(attempts - 1, 0), updated_at = ? WHERE task_index = ? AND lease_id = ?",
+                (PENDING, time.time(), index, lease_id),
+            )
+            self._conn.commit()
+
+    def counts(self, indices=None) -> dict:
+        with self._lock:
+            self._expire(time.time())
+            self._conn.commit()
+            query = "SELECT state, COUNT(*) FROM tasks"
+            params = []
+            if indices is not None:
+                query += f" WHERE task_index IN ({','.join('?' * len(indices))})"
+                params = list(indices)
+            rows = self._conn.execute(query + " GROUP BY state", params).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def workers(self) -> dict:
+        """Currently leased indices per worker."""
+        with self._lock:
+            rows = self._conn.execute("SELECT worker, task_index FROM tasks WHERE state = ?", (LEASED,)).fetchall()
+        leased = {}
+        for worker, index in rows:
+            leased.setdefault(worker, []).append(index)
+        return leased
+
+    def close(self):
+        with self._lock:
+            self._conn.close()